@@ -0,0 +1,34 @@
+--
+-- Migrates an smf database created w/ an earlier smf.sql, in which the
+-- cells & roads_cells tables have no cell_size column. rows of the existing
+-- tables are kept, and get the default cell size of 20 m.
+--
+--   $ mysql -u root -p smf < smf-cell-size.sql
+--
+
+/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;
+
+--
+-- cells : primary key <id> -> <id, cell_size>
+--
+
+ALTER TABLE `cells`
+  ADD COLUMN `cell_size` double NOT NULL DEFAULT 20.0 AFTER `id`,
+  DROP PRIMARY KEY,
+  ADD CONSTRAINT PK_cells PRIMARY KEY (id, cell_size);
+ALTER TABLE `cells` ALTER COLUMN `cell_size` DROP DEFAULT;
+
+--
+-- roads_cells : primary key <road_id, cell_id> -> <road_id, cell_id, cell_size>.
+-- roads_cells_ibfk_2 is the name innodb gives to the old foreign key on cell_id.
+--
+
+ALTER TABLE `roads_cells`
+  DROP FOREIGN KEY `roads_cells_ibfk_2`,
+  ADD COLUMN `cell_size` double NOT NULL DEFAULT 20.0 AFTER `cell_id`,
+  DROP PRIMARY KEY,
+  ADD CONSTRAINT PK_roads_cells PRIMARY KEY (road_id, cell_id, cell_size),
+  ADD FOREIGN KEY (cell_id, cell_size) REFERENCES cells (id, cell_size);
+ALTER TABLE `roads_cells` ALTER COLUMN `cell_size` DROP DEFAULT;
+
+/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;
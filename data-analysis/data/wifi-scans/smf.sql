@@ -34,9 +34,15 @@ DROP TABLE IF EXISTS `cells`;
 /*!40101 SET @saved_cs_client     = @@character_set_client */;
 /*!40101 SET character_set_client = utf8 */;
 CREATE TABLE `cells` (
-  `id` bigint(20) NOT NULL PRIMARY KEY,
+  `id` bigint(20) NOT NULL,
+  `cell_size` double NOT NULL,
   `cell_x` bigint(20) DEFAULT NULL,
-  `cell_y` bigint(20) DEFAULT NULL
+  `cell_y` bigint(20) DEFAULT NULL,
+  CONSTRAINT PK_cells PRIMARY KEY
+  (
+      id,
+      cell_size
+  )
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -114,13 +120,15 @@ DROP TABLE IF EXISTS `roads_cells`;
 CREATE TABLE `roads_cells` (
   `road_id` bigint(20) NOT NULL,
   `cell_id` bigint(20) NOT NULL,
+  `cell_size` double NOT NULL,
   CONSTRAINT PK_roads_cells PRIMARY KEY
   (
       road_id,
-      cell_id
+      cell_id,
+      cell_size
   ),
   FOREIGN KEY (road_id) REFERENCES roads (id),
-  FOREIGN KEY (cell_id) REFERENCES cells (id)
+  FOREIGN KEY (cell_id, cell_size) REFERENCES cells (id, cell_size)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -40,6 +40,7 @@ import analysis.ap_selection.gps
 import analysis.smc.utils
 
 import mapping.utils
+import utils.hdfs
 
 # wifi net operators
 operators = {
@@ -110,11 +111,7 @@ def is_public(essid, operator):
     return 0    
 
 def get_db(input_dir):
-    db_dir = os.path.join(input_dir, ("processed"))
-    if not os.path.isdir(db_dir):
-        os.makedirs(db_dir)
-    database = pd.HDFStore(os.path.join(db_dir, "smc.hdf5"))
-    return database
+    return utils.hdfs.get_db(input_dir, 'smc.hdf5')
 
 def calc_dist(data):
     data['dist'] = mapping.utils.gps_to_dist(data['new_lat'], data['new_lon'], data['new_lat'].shift(1), data['new_lon'].shift(1))
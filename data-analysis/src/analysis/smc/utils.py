@@ -1,7 +1,13 @@
 from __future__ import absolute_import
 
 import pandas as pd
+import numpy as np
 import os
+import re
+
+# custom imports
+#   - hdfs utils
+import utils.hdfs
 
 # wifi net operators
 operators = {
@@ -58,12 +64,57 @@ def is_public(essid, operator):
         return 1
     return 0    
 
+def _get_match_re(match_str):
+    # regex w/ the substrings of a 'match-str' or 'public' string as (escaped) alternatives.
+    # as in get_operator() and is_public(), an empty substring matches any essid.
+    return '|'.join([ re.escape(ss) for ss in match_str.split('|') ])
+
+class OperatorClassifier(object):
+
+    # get_operator() and is_public() over many essids, w/ regexes compiled once from operators:
+    #   - a single regex for the operator, w/ one lookahead alternative per operator, tried in
+    #     the same order as get_operator(), so that essids which match the 'match-str' of
+    #     several operators (e.g. 'MEO-NOS') get the 1st one, as before
+    #   - one regex per operator for the 'public' substrings
+    def __init__(self, operators = operators):
+
+        self.ops = list(operators.keys())
+        self.op_re = re.compile('|'.join([ ('(?=.*?(?:%s))(?P<op%d>)' % (_get_match_re(operators[op]['match-str']), i)) for i, op in enumerate(self.ops) ]), re.DOTALL)
+        self.public_re = { op : re.compile(_get_match_re(operators[op]['public'])) for op in self.ops }
+
+    def get_operator(self, essid):
+        m = self.op_re.match(essid)
+        return self.ops[int(m.lastgroup[2:])] if m else 0
+
+    def is_public(self, essid, operator):
+        if operator == 0:
+            return 0
+        return 1 if self.public_re[operator].search(essid) else 0
+
+    def classify(self, essids):
+
+        # vectorized version of get_operator() and is_public(), e.g. over the 'essid' column of a chunk.
+        # essids are matched once per distinct value, and results mapped back to rows by category codes,
+        # so the cost depends on the nr. of distinct essids, not rows. nan essids get operator 0.
+        # returns (operator_id, is_public) arrays.
+        essids = pd.Series(essids).astype('category')
+        ops = np.array([ self.get_operator(str(s)) for s in essids.cat.categories ] + [0], dtype = np.int64)
+        public = np.array([ self.is_public(str(s), op) for s, op in zip(essids.cat.categories, ops) ] + [0], dtype = np.int64)
+        # nan essids have code -1, i.e. the last (0) element of ops and public
+        codes = essids.cat.codes.values
+        return ops[codes], public[codes]
+
+# built on 1st use by classify_essids()
+_classifier = None
+
+def classify_essids(essids):
+    global _classifier
+    if _classifier is None:
+        _classifier = OperatorClassifier()
+    return _classifier.classify(essids)
+
 def get_db(input_dir):
-    db_dir = os.path.join(input_dir, ("processed"))
-    if not os.path.isdir(db_dir):
-        os.makedirs(db_dir)
-    database = pd.HDFStore(os.path.join(db_dir, "smc.hdf5"))
-    return database
+    return utils.hdfs.get_db(input_dir, 'smc.hdf5')
 
 def calc_dist(data):
     data['dist'] = mapping.utils.gps_to_dist(data['new_lat'], data['new_lon'], data['new_lat'].shift(1), data['new_lon'].shift(1))
@@ -4,3 +4,4 @@ import analysis.trace.ap_selection.gps
 import analysis.trace.ap_selection.rss
 import analysis.trace.ap_selection.ml
 import analysis.trace.ap_selection.utils
+import analysis.trace.ap_selection.sweep
@@ -26,6 +26,7 @@ import utils.hdfs
 #   - mapping utils
 import utils.mapping.utils
 #   - analysis
+import analysis.trace
 
 # north, south, west, east gps coord limits of FEUP map
 LATN = 41.176796
@@ -73,7 +74,7 @@ def optimize_handoffs(input_dir, trace_nr, args, force_calc = False):
     if opt_db in database_keys:
         if force_calc:
             # database.remove(opt_db)
-            utils.hdfs.remove_dbs(trace_dir, [opt_db])
+            utils.hdfs.remove_dbs(trace_dir, dbs = [opt_db])
         else:
             sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (opt_db))
             return
@@ -111,6 +112,36 @@ def optimize_handoffs(input_dir, trace_nr, args, force_calc = False):
 
     utils.hdfs.to_hdfs(data, opt_db, database)    
 
+def cell_history_selection(data, args):
+
+    # add period numbers, i.e. distinct periods of time during which client was in a distinct cell <x,y>
+    nodes = ['m1', 'w1', 'w2', 'w3']
+    data = data.sort_values(by = ['cell_id', 'timed-tmstmp']).reset_index(drop = True)
+    data['period'] = (((data['timed-tmstmp'] - data['timed-tmstmp'].shift(1)) > 5.0) | (data['cell_id'] != data['cell_id'].shift(1))).astype(int).cumsum()
+    # calc avg <metric> per cell-period
+    sel_period = data[['cell_id', 'period'] + nodes].groupby(['cell_id', 'period']).mean().reset_index(drop = False)
+
+    if args['metric'] == 'rss':
+        sel_period = sel_period.fillna(-100.0)
+    else:
+        sel_period = sel_period.fillna(0.0)
+
+    # calculate selection plan, per cell period
+    sel_period = sel_period.groupby(['cell_id']).apply(select_gps, method = 'cell-history', args = args)
+
+    selection = pd.merge(data, sel_period[['period', 'best']], on = ['period'], how = 'left')
+    # print(len(selection))
+    # selection['timed-tmstmp-str'] = selection['timed-tmstmp'].astype(str)
+    # print(selection[selection.duplicated(subset = ['timed-tmstmp'], keep = False)].sort_values(by = ['timed-tmstmp']))
+    # sys.exit(0)
+    selection = selection.drop_duplicates(subset = ['timed-tmstmp']).reset_index(drop = True)
+    selection = selection.sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
+    selection[args['metric']] = 0.0
+    for node in nodes:
+        selection.loc[selection['best'] == node, args['metric']] = selection[selection['best'] == node][node]
+
+    return selection
+
 def cell_history(input_dir, trace_nr,
     args,
     force_calc = False):
@@ -136,7 +167,7 @@ def cell_history(input_dir, trace_nr,
     if cell_history_db in database_keys:
         if force_calc:
             # database.remove(cell_history_db)
-            utils.hdfs.remove_dbs(trace_dir, [cell_history_db])
+            utils.hdfs.remove_dbs(trace_dir, dbs = [cell_history_db])
         else:
             sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (cell_history_db))
             return
@@ -144,32 +175,7 @@ def cell_history(input_dir, trace_nr,
     # merge /best/<metric> & gps data + add cell info
     data = analysis.trace.utils.data.merge_gps(input_dir, trace_nr, args['metric'], cell_size = float(args['cell-size']))
 
-    # add period numbers, i.e. distinct periods of time during which client was in a distinct cell <x,y>
-    nodes = ['m1', 'w1', 'w2', 'w3']
-    data = data.sort_values(by = ['cell_id', 'timed-tmstmp']).reset_index(drop = True)
-    data['period'] = (((data['timed-tmstmp'] - data['timed-tmstmp'].shift(1)) > 5.0) | (data['cell_id'] != data['cell_id'].shift(1))).astype(int).cumsum()
-    # calc avg <metric> per cell-period
-    sel_period = data[['cell_id', 'period'] + nodes].groupby(['cell_id', 'period']).mean().reset_index(drop = False)
-
-    if args['metric'] == 'rss':
-        sel_period = sel_period.fillna(-100.0)
-    else:
-        sel_period = sel_period.fillna(0.0)
-
-    # calculate selection plan, per cell period
-    sel_period = sel_period.groupby(['cell_id']).apply(select_gps, method = 'cell-history', args = args)
-
-    selection = pd.merge(data, sel_period[['period', 'best']], on = ['period'], how = 'left')
-    # print(len(selection))
-    # selection['timed-tmstmp-str'] = selection['timed-tmstmp'].astype(str)
-    # print(selection[selection.duplicated(subset = ['timed-tmstmp'], keep = False)].sort_values(by = ['timed-tmstmp']))
-    # sys.exit(0)
-    selection = selection.drop_duplicates(subset = ['timed-tmstmp']).reset_index(drop = True)
-    selection = selection.sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
-    selection[args['metric']] = 0.0
-    for node in nodes:
-        selection.loc[selection['best'] == node, args['metric']] = selection[selection['best'] == node][node]
-
+    selection = cell_history_selection(data, args)
     utils.hdfs.to_hdfs(selection, cell_history_db, database)
 
 def scripted_handoffs(input_dir, trace_nr,
@@ -186,7 +192,7 @@ def scripted_handoffs(input_dir, trace_nr,
     if sh_db in database_keys:
         if force_calc:
             # database.remove(sh_db)
-            utils.hdfs.remove_dbs(trace_dir, [sh_db])
+            utils.hdfs.remove_dbs(trace_dir, dbs = [sh_db])
             # print("aint deletin' anythin' yet")
         else:
             sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (sh_db))
@@ -200,22 +206,16 @@ def scripted_handoffs(input_dir, trace_nr,
     # calculate distances & direction of movement, relative to a reference point (located outside of the circuit)
     # FIXME : the ref_point should be given as argument
     ref_point = {'lat' : 41.178685, 'lon' : -8.597872}
-    pos = [ [ row['lat'], row['lon'] ] for index, row in data[['lat', 'lon']].iterrows() ]
-    data['ref-dist'] = [ utils.mapping.utils.gps_to_dist(ref_point['lat'], ref_point['lon'], p[0], p[1]) for p in pos ]
+    data['ref-dist'] = utils.mapping.utils.gps_to_dist_matrix(data['lat'].values, data['lon'].values, ref_point['lat'], ref_point['lon'])[:, 0]
     # to make things easier, treat ref distances in m precision
     data['ref-dist'] = data['ref-dist'].apply(lambda x : round(x))
 
     # add lap numbers to data
-    laps = analysis.trace.utils.data.extract_laps(input_dir, trace_nr)
+    laps = analysis.trace.utils.gps.get_laps(trace_dir)
     data['lap'] = -1
     data['direction'] = 1
-    for l, row in laps.iterrows():
-
-        if row['lap'] == -1:
-            continue
-
-        data.loc[(data['timed-tmstmp'] >= row['start-time']) & (data['timed-tmstmp'] < row['end-time']), 'lap'] = row['lap'].astype(int)
-        data.loc[(data['timed-tmstmp'] >= row['start-time']) & (data['timed-tmstmp'] < row['end-time']), 'direction'] = row['direction'].astype(int)
+    if not laps.empty:
+        analysis.trace.utils.intervals.join_intervals(data, laps[laps['lap'] != -1], on = 'timed-tmstmp', columns = ['lap', 'direction'])
 
     # data['timed-tmstmp-str'] = data['timed-tmstmp'].astype(str)
     # for l in xrange(0, data['lap'].max()):
@@ -36,7 +36,6 @@ def get_beacon_data(input_dir, trace_nr):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
     database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
-    database_keys = utils.hdfs.get_db_keys(trace_dir)
 
     data = pd.DataFrame()
     # merge:
@@ -78,8 +77,6 @@ def classification_beacons(input_dir, trace_nr,
     force_calc = False):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
-    database_keys = utils.hdfs.get_db_keys(trace_dir)
 
     # get beacon features & labels
     data = get_beacon_data(input_dir, trace_nr)
@@ -123,8 +120,6 @@ def regression_beacons(input_dir, trace_nr,
     force_calc = False):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
-    database_keys = utils.hdfs.get_db_keys(trace_dir)
 
     # get beacon features & labels
     data = get_beacon_data(input_dir, trace_nr)
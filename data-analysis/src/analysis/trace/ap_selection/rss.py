@@ -16,6 +16,7 @@
 from __future__ import absolute_import
 
 import pandas as pd
+import numpy as np
 import os
 import sys
 
@@ -23,6 +24,7 @@ import sys
 #   - hdfs utils
 import utils.hdfs
 #   - analysis
+import analysis.trace
 
 # north, south, west, east limits of map, in terms of geo coordinates
 LATN = 41.176796
@@ -33,21 +35,121 @@ LONW = -8.598336
 LAT  = (41.176796 + 41.179283) / 2.0
 LON = (-8.598336 + -8.593912) / 2.0
 
-# source : https://medium.com/@sean.turner026/applying-custom-functions-to-groupby-objects-in-pandas-61af58955569
-def select_rss(data, aps, mode = 'strongest-rss'):
+# ap bands. bands code:
+#   1 : just 2.4 GHz
+#   2 : just 5 GHz
+#   3 : both 2.4 GHz and 5 GHz
+# FIXME : this should be loaded from a file
+NODES = {'m1' : {'band' : 2}, 'w1' : {'band' : 2}, 'w2' : {'band' : 1}, 'w3' : {'band' : 1}}
 
-    if mode == 'strongest-rss':
+def get_aps(bands = 3):
+    return [ node for node in NODES.keys() if (int(bands) == 3) or (NODES[node]['band'] == int(bands)) ]
 
-        # # FIXME : don't consider 'w3' after lap 5
-        # if (data.iloc[0]['lap'] > 6) and ('w3' in aps):
-        #     aps.remove('w3')
+def strongest_rss_selection(rss_data, aps, scan_period = 5.0, scan_time = 0.5):
 
-        # highest rss among rows w/ ['scan period'] == 1
-        ap = data[data['scan-period'] == 1][aps].max().idxmax(axis = 1)
-        data['best'] = ap
-        data['best-obs'] = data[data['scan-period'] == 1][aps].max()[ap]
+    # mark scan periods
+    sp = scan_period
+    st = scan_time
+    rss_data = rss_data.copy()
+    rss_data['ap-period'] = ((rss_data['timed-tmstmp'] - rss_data.iloc[0]['timed-tmstmp']) / (sp + st)).astype(int)
+    rss_data['scan-period'] = (((rss_data.groupby(['ap-period'])['timed-tmstmp'].transform(lambda x : x.diff().cumsum()).fillna(0.0) / (st)).astype(int)) == 0).astype(int)
+
+    # pick the ap w/ highest rss among rows w/ ['scan-period'] == 1, for each ap period
+    scans = rss_data[rss_data['scan-period'] == 1][['ap-period'] + aps].groupby(['ap-period']).max()
+    scans = scans.dropna(how = 'all')
+    selection = pd.DataFrame({
+        'ap-period' : scans.index, 
+        'best' : np.array(aps, dtype = object)[np.argmax(scans.fillna(-np.inf).values, axis = 1)],
+        'best-obs' : scans.max(axis = 1).values})
+
+    return pd.merge(rss_data, selection, on = ['ap-period'], how = 'left')
+
+def get_rss_data(database, database_keys, bands = 3):
+
+    # merge all beacons from all aps, in a single dataframe w/ columns ['timed-tmstmp', <ap 1>, <ap 2>, ...].
+    # the merged data is read from the trace's cached rss ap matrix.
+    aps = get_aps(bands)
+    for node in aps:
+        db = ('/%s/%s/%s' % (node, 'basic', 'beacons'))
+        if db not in database_keys:
+            return None, aps
+
+    rss_data = analysis.trace.utils.data.get_ap_matrix(database, 'rss')[['timed-tmstmp'] + aps]
+    rss_data = rss_data.dropna(subset = aps, how = 'all').reset_index(drop = True)
+
+    return rss_data, aps
+
+def hysteresis_kernel(rss, hysteresis = 5.0, floor = -80.0):
+
+    # smoothed rss + hysteresis ap selection over a [nr. of samples x nr. of aps] matrix of 
+    # smoothed rss values. returns 2 arrays w/ the selected ap (column index, -1 if none) 
+    # and its rss, per sample :
+    #   - the 1st ap is the one w/ max rss in the 1st valid sample (i.e. not all nan)
+    #   - keep the current ap while rss[curr_ap] > (max(rss) - hysteresis) and rss[curr_ap] > floor
+    #   - otherwise, switch to the ap w/ max rss if max(rss) > floor, or select no ap (-1)
+    # a switch only happens on samples which break the 1st condition for the current ap, so 
+    # we pre-compute these 'break' samples for each ap, and jump from switch to switch
+    rss = np.asarray(rss, dtype = float)
+    n, m = rss.shape
+
+    _rss = np.where(np.isnan(rss), -np.inf, rss)
+    valid = ~np.all(np.isnan(rss), axis = 1)
+    best = np.where(valid, np.argmax(_rss, axis = 1), -1)
+    best_obs = np.where(valid, np.max(_rss, axis = 1), -90.0)
+
+    start = np.flatnonzero(valid)
+    if len(start) == 0:
+        return best, best_obs
+    start = start[0]
+
+    mx = best_obs[:, np.newaxis]
+    keep = (rss > (mx - hysteresis)) & (rss > floor)
+    switch = valid & (best_obs > floor)
+    breaks = [ np.flatnonzero(switch & ~keep[:, a]) for a in range(m) ]
+
+    # walk from switch to switch. starts[i] is the 1st sample ruled by states[i], i.e. the 1st 
+    # sample after the switch (or after the 1st valid sample), which may itself be a break.
+    starts = [start + 1]
+    states = [best[start]]
+    while True:
+        a = states[-1]
+        k = np.searchsorted(breaks[a], starts[-1], side = 'left')
+        if k >= len(breaks[a]):
+            break
+        # ap changes *after* the break sample
+        starts.append(breaks[a][k] + 1)
+        states.append(best[breaks[a][k]])
+
+    # current ap at each sample, and apply the rules to samples after the 1st valid sample
+    rows = np.arange(start + 1, n)
+    state = np.array(states)[np.searchsorted(starts, rows, side = 'right') - 1]
+    curr_keep = valid[rows] & keep[rows, state]
+    curr_drop = valid[rows] & ~keep[rows, state] & ~switch[rows]
+
+    best_obs[rows[curr_keep]] = rss[rows[curr_keep], state[curr_keep]]
+    best[rows[curr_keep]] = state[curr_keep]
+    best[rows[curr_drop]] = -1
+
+    return best, best_obs
+
+def smoothed_hysteresis_selection(rss_data, aps, w = 5.0, hysteresis = 5.0, floor = -80.0):
+
+    # smoothen rss data
+    rss_data = rss_data.copy()
+    rss_data[aps] = rss_data[aps].interpolate(limit = 3)
+    rss_data[aps] = rss_data[aps].fillna(-80.0)
+    # default 5 second window
+    rss_data[aps] = rss_data[aps].rolling(int(w / 0.5)).mean()
+    rss_data[aps] = rss_data[aps].astype(float)
+
+    # apply smoothed rss + hysteresis algorithm:
+    #   - compare rss[best] and rss[prev_best] mean of w / 0.5 previous samples
+    #   - if smoothed_rss[prev_best] > (smoothed_rss[new_best] - hysteresis), keep the current ap
+    best, best_obs = hysteresis_kernel(rss_data[aps].values, hysteresis = hysteresis, floor = floor)
+    rss_data['best'] = np.where(best < 0, -1, np.array(aps, dtype = object)[best])
+    rss_data['best-obs'] = best_obs
 
-    return data
+    return rss_data
 
 def strongest_rss(input_dir, trace_nr,
     method = 'strongest-rss',
@@ -63,53 +165,25 @@ def strongest_rss(input_dir, trace_nr,
     if db_name in database_keys:
         if force_calc:
             # database.remove(db_name)
-            utils.hdfs.remove_dbs(trace_dir, [db_name])
+            utils.hdfs.remove_dbs(trace_dir, dbs = [db_name])
         else:
             sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (db_name))
             return
 
     # merge all beacons from all aps
-    nodes = {'m1' : {'band' : 2}, 'w1' : {'band' : 2}, 'w2' : {'band' : 1}, 'w3' : {'band' : 1}}
-    aps = []
-    rss_data = pd.DataFrame(columns = ['timed-tmstmp'])
-    for node in nodes.keys():
-
-        # bands code:
-        #   1 : just 2.4 GHz
-        #   2 : just 5 GHz
-        #   3 : both 2.4 GHz and 5 GHz
-        if (int(args['bands']) < 3) and (nodes[node]['band'] != int(args['bands'])):
-            continue
-
-        aps.append(node)
-
-        db = ('/%s/%s/%s' % (node, 'basic', 'beacons'))
-        if db not in database_keys:
-            return None
-
-        data = database.select(db)[['epoch time', 'wlan rssi']].sort_values(by = ['epoch time']).reset_index(drop = True)
-        data['timed-tmstmp'] = data['epoch time'].apply(analysis.metrics.custom_round)
-        # 'shrink' w/ max per 'timed-tmstmp'
-        data = data[['timed-tmstmp', 'wlan rssi']].groupby(['timed-tmstmp']).max().reset_index(drop = False).sort_values(by = ['timed-tmstmp'])
-        data[node] = data['wlan rssi']
-        rss_data = pd.merge(rss_data, data[ ['timed-tmstmp', node] ], on = ['timed-tmstmp'], how = 'outer')
-
-    # mark scan periods
-    sp = args['scan-period']
-    st = args['scan-time']
-    rss_data['ap-period'] = ((rss_data['timed-tmstmp'] - rss_data.iloc[0]['timed-tmstmp']) / (sp + st)).astype(int)
-    rss_data['scan-period'] = (((rss_data.groupby(['ap-period'])['timed-tmstmp'].transform(lambda x : x.diff().cumsum()).fillna(0.0) / (st)).astype(int)) == 0).astype(int)
+    rss_data, aps = get_rss_data(database, database_keys, bands = args['bands'])
+    if rss_data is None:
+        return None
 
-    # add lap numbers
-    laps = analysis.gps.get_lap_timestamps(input_dir, trace_nr)
-    # add lap numbers to data
+    # add lap numbers to data, from the [start-time, end-time[ intervals in laps.csv (as in ap_selection.gps). 
+    # rows outside laps (or w/o laps.csv) keep lap nr. -1.
+    laps = analysis.trace.utils.gps.get_laps(trace_dir)
     rss_data['lap'] = -1
-    for l, row in laps.iterrows():
-        rss_data.loc[(rss_data['lap'] == -1) & (rss_data['timed-tmstmp'] <= row['timed-tmstmp']), 'lap'] = row['lap']
-    rss_data.loc[rss_data['lap'] == -1, 'lap'] = len(laps)
+    if not laps.empty:
+        analysis.trace.utils.intervals.join_intervals(rss_data, laps[laps['lap'] != -1], on = 'timed-tmstmp', columns = ['lap'])
 
-    # now, groupby() scan period and pick the ap w/ max rss during a scan period
-    selection = rss_data.groupby(['ap-period']).apply(select_rss, aps = aps, mode = 'strongest-rss')
+    # now, pick the ap w/ max rss during each scan period
+    selection = strongest_rss_selection(rss_data, aps, scan_period = args['scan-period'], scan_time = args['scan-time'])
     utils.hdfs.to_hdfs(selection, db_name, database)
 
 def smoothed_hyteresis(input_dir, trace_nr,
@@ -126,94 +200,24 @@ def smoothed_hyteresis(input_dir, trace_nr,
     if db_name in database_keys:
         if force_calc:
             # database.remove(db_name)
-            utils.hdfs.remove_dbs(trace_dir, [db_name])
+            utils.hdfs.remove_dbs(trace_dir, dbs = [db_name])
         else:
             sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (db_name))
             return
 
     # merge all beacons from all aps
-    nodes = {'m1' : {'band' : 2}, 'w1' : {'band' : 2}, 'w2' : {'band' : 1}, 'w3' : {'band' : 1}}
-    aps = []
-    rss_data = pd.DataFrame(columns = ['timed-tmstmp'])
-    for node in nodes.keys():
+    rss_data, aps = get_rss_data(database, database_keys, bands = args['bands'])
+    if rss_data is None:
+        return None
 
-        # bands code:
-        #   1 : just 2.4 GHz
-        #   2 : just 5 GHz
-        #   3 : both 2.4 GHz and 5 GHz
-        if (int(args['bands']) < 3) and (nodes[node]['band'] != int(args['bands'])):
-            continue
-
-        aps.append(node)
-
-        db = ('/%s/%s/%s' % (node, 'basic', 'beacons'))
-        if db not in database_keys:
-            return None
-
-        data = database.select(db)[['epoch time', 'wlan rssi']].sort_values(by = ['epoch time']).reset_index(drop = True)
-        data['timed-tmstmp'] = data['epoch time'].apply(analysis.metrics.custom_round)
-        # 'shrink' w/ max per 'timed-tmstmp'
-        data = data[['timed-tmstmp', 'wlan rssi']].groupby(['timed-tmstmp']).max().reset_index(drop = False).sort_values(by = ['timed-tmstmp'])
-        data[node] = data['wlan rssi']
-        rss_data = pd.merge(rss_data, data[ ['timed-tmstmp', node] ], on = ['timed-tmstmp'], how = 'outer')
-
-    # smoothen rss data
-    cols = list(rss_data.columns)
-    cols.remove('timed-tmstmp')
-    rss_data[cols] = rss_data[cols].interpolate(limit = 3)
-    rss_data[cols] = rss_data[cols].fillna(-80.0)
-    # default 5 second window
-    w = args['w']
-    rss_data[cols] = rss_data[cols].rolling(int(w / 0.5)).mean()
-    rss_data[cols] = rss_data[cols].astype(float)
-
-    rss_data['best'] = rss_data[cols].idxmax(axis = 1)
-    rss_data['best'] = rss_data['best'].fillna(-1)
-    rss_data['best-obs'] = rss_data[cols].max(axis = 1)
-    rss_data['best-obs'] = rss_data['best-obs'].fillna(-90.0)
-
-    # apply smoothed rss + hysteresis algorithm:
-    #   - assume a hysteresis of 5 dBm
-    #   - compare rss[best] and rss[prev_best] mean of w / 0.5 previous samples
-    #   - if smoothed_rss[prev_best] > (smoothed_rss[new_best] - 5), keep the current ap
-    # FIXME : this iterative approach is very inefficient (and ugly to look at)
-    j = 0
-    prev_b = None
-
-    for i in xrange(0, len(rss_data)):
-        prev_b = rss_data['best'].loc[i]
-        if prev_b > 0:
-            break
-        j += 1
-
-    for i in xrange(j + 1, len(rss_data)):
-        b = rss_data['best'].loc[i]
-        if b < 0:
-            continue
-
-        # FIXME : this is a patch to solve some stupid error, 
-        # which makes a pd.core.series.Series appear in the middle of 
-        # a column of a DataFrame, which is otherwise filled w/ float...
-        curr_rss = rss_data[b].loc[i]
-        if isinstance(curr_rss, pd.core.series.Series):
-            curr_rss = curr_rss.max()
-
-        prev_rss = rss_data[prev_b].loc[i]
-
-        if (prev_rss > (curr_rss - 5.0)) and (prev_rss > -80.0):
-            rss_data.loc[i, 'best'] = prev_b
-            rss_data.loc[i, 'best-obs'] = prev_rss
-        elif (curr_rss > -80.0):
-            prev_b = b
-            rss_data.loc[i, 'best-obs'] = curr_rss
-        else:
-            rss_data.loc[i, 'best'] = -1
+    rss_data = smoothed_hysteresis_selection(rss_data, aps, w = args['w'], hysteresis = args['hysteresis'])
 
     rss_data = rss_data[rss_data['best'] != -1].reset_index(drop = True)
     utils.hdfs.to_hdfs(rss_data, db_name, database)
 
 def ap_scores(input_dir, trace_nr,
     method = 'ap-scores',
+    args = {'w' : 5.0, 'hysteresis' : 5.0, 'bands' : 3},
     force_calc = False):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
@@ -228,87 +232,16 @@ def ap_scores(input_dir, trace_nr,
     if db_name in database_keys:
         if force_calc:
             # database.remove(db_name)
-            utils.hdfs.remove_dbs(trace_dir, [db_name])
+            utils.hdfs.remove_dbs(trace_dir, dbs = [db_name])
         else:
             sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (db_name))
             return
 
     # merge all beacons from all aps
-    nodes = {'m1' : {'band' : 2}, 'w1' : {'band' : 2}, 'w2' : {'band' : 1}, 'w3' : {'band' : 1}}
-    aps = []
-    rss_data = pd.DataFrame(columns = ['timed-tmstmp'])
-    for node in nodes.keys():
+    rss_data, aps = get_rss_data(database, database_keys, bands = args['bands'])
+    if rss_data is None:
+        return None
 
-        # bands code:
-        #   1 : just 2.4 GHz
-        #   2 : just 5 GHz
-        #   3 : both 2.4 GHz and 5 GHz
-        if (int(args['bands']) < 3) and (nodes[node]['band'] != int(args['bands'])):
-            continue
-
-        aps.append(node)
-
-        db = ('/%s/%s/%s' % (node, 'basic', 'beacons'))
-        if db not in database_keys:
-            return None
-
-        data = database.select(db)[['epoch time', 'wlan rssi']].sort_values(by = ['epoch time']).reset_index(drop = True)
-        data['timed-tmstmp'] = data['epoch time'].apply(analysis.metrics.custom_round)
-        # 'shrink' w/ max per 'timed-tmstmp'
-        data = data[['timed-tmstmp', 'wlan rssi']].groupby(['timed-tmstmp']).max().reset_index(drop = False).sort_values(by = ['timed-tmstmp'])
-        data[node] = data['wlan rssi']
-        rss_data = pd.merge(rss_data, data[ ['timed-tmstmp', node] ], on = ['timed-tmstmp'], how = 'outer')
-
-    # smoothen rss data
-    cols = list(rss_data.columns)
-    cols.remove('timed-tmstmp')
-    rss_data[cols] = rss_data[cols].interpolate(limit = 3)
-    rss_data[cols] = rss_data[cols].fillna(-80.0)
-    # default 5 second window
-    w = 5.0
-    rss_data[cols] = rss_data[cols].rolling((w / 0.5)).mean()
-    rss_data[cols] = rss_data[cols].astype(float)
-
-    rss_data['best'] = rss_data[cols].idxmax(axis = 1)
-    rss_data['best'] = rss_data['best'].fillna(-1)
-    rss_data['best-obs'] = rss_data[cols].max(axis = 1)
-    rss_data['best-obs'] = rss_data['best-obs'].fillna(-90.0)
-
-    # apply smoothed rss + hysteresis algorithm:
-    #   - assume a hysteresis of 5 dBm
-    #   - compare rss[best] and rss[prev_best] mean of w / 0.5 previous samples
-    #   - if smoothed_rss[prev_best] > (smoothed_rss[new_best] - 5), keep the current ap
-    # FIXME : this iterative approach is very inefficient (and ugly to look at)
-    j = 0
-    prev_b = None
-
-    for i in xrange(0, len(rss_data)):
-        prev_b = rss_data['best'].loc[i]
-        if prev_b > 0:
-            break
-        j += 1
-
-    for i in xrange(j + 1, len(rss_data)):
-        b = rss_data['best'].loc[i]
-        if b < 0:
-            continue
-
-        # FIXME : this is a patch to solve some stupid error, 
-        # which makes a pd.core.series.Series appear in the middle of 
-        # a column of a DataFrame, which is otherwise filled w/ float...
-        curr_rss = rss_data[b].loc[i]
-        if isinstance(curr_rss, pd.core.series.Series):
-            curr_rss = curr_rss.max()
-
-        prev_rss = rss_data[prev_b].loc[i]
-
-        if (prev_rss > (curr_rss - 5.0)) and (prev_rss > -80.0):
-            rss_data.loc[i, 'best'] = prev_b
-            rss_data.loc[i, 'best-obs'] = prev_rss
-        elif (curr_rss > -80.0):
-            prev_b = b
-            rss_data.loc[i, 'best-obs'] = curr_rss
-        else:
-            rss_data.loc[i, 'best'] = -1
+    rss_data = smoothed_hysteresis_selection(rss_data, aps, w = args['w'], hysteresis = args['hysteresis'])
 
     utils.hdfs.to_hdfs(rss_data, db_name, database)
\ No newline at end of file
@@ -0,0 +1,197 @@
+# sweep.py : evaluate ap selection methods over grids of parameters
+# Copyright (C) 2018  adamiaonr@cmu.edu
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import absolute_import
+
+import pandas as pd
+import numpy as np
+import os
+import sys
+import itertools
+import timeit
+import multiprocessing as mp
+
+# custom imports
+#   - hdfs utils
+import utils.hdfs
+#   - analysis
+import analysis.trace
+
+# parameters of each ap selection method, in the order used in the selection db names
+PARAMS = {
+    'strongest-rss' : ['scan-period', 'scan-time', 'bands'],
+    'smoothed-hysteresis' : ['w', 'hysteresis', 'bands'],
+    'cell-history' : ['metric', 'cell-size', 'stat', 'stat-args']
+}
+
+# inputs shared by all configurations of a sweep, set once per worker process
+_inputs = {}
+
+def get_grid(method, params):
+
+    # list of configurations w/ all combinations of parameter values, e.g.:
+    #   get_grid('smoothed-hysteresis', {'w' : [2.5, 5.0], 'hysteresis' : [2.0, 5.0], 'bands' : [3]})
+    #   -> [{'method' : 'smoothed-hysteresis', 'w' : 2.5, 'hysteresis' : 2.0, 'bands' : 3}, ...]
+    keys = [ k for k in PARAMS[method] if k in params ]
+    configs = []
+    for values in itertools.product(*[ params[k] for k in keys ]):
+        config = dict(zip(keys, values))
+        config['method'] = method
+        configs.append(config)
+
+    return configs
+
+def get_config_str(config):
+    # e.g. '5.0/5.0/3', as in '/selection/rss/smoothed-hysteresis/5.0/5.0/3'
+    params = []
+    for p in PARAMS[config['method']]:
+        if p == 'stat-args':
+            params.append('-'.join([str(v) for v in config[p].values()]))
+        elif p == 'bands':
+            params.append('%d' % (int(config[p])))
+        else:
+            params.append('%s' % (config[p]))
+
+    return '/'.join(params)
+
+def get_inputs(input_dir, trace_nr, configs, metric = 'throughput'):
+
+    # load the data shared by all configurations once per trace:
+    #   - perf : /best/<metric>, used to score each selection plan
+    #   - rss : merged beacon rss of all aps, used by rss-based methods
+    #   - gps : /best/<metric> + gps + cell info, per <metric, cell size>, used by cell-history
+    trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
+    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
+    database_keys = utils.hdfs.get_db_keys(trace_dir)
+
+    nodes = ['m1', 'w1', 'w2', 'w3']
+    base_db = analysis.trace.utils.data.extract_best(input_dir, trace_nr, metric)
+    inputs = {
+        'metric' : metric,
+        'nodes' : nodes,
+        'perf' : database.select(base_db, columns = ['timed-tmstmp'] + nodes).sort_values(by = ['timed-tmstmp']).reset_index(drop = True),
+        'rss' : None,
+        'gps' : {}}
+
+    methods = set([ c['method'] for c in configs ])
+    if ('strongest-rss' in methods) or ('smoothed-hysteresis' in methods):
+        rss_data, aps = analysis.trace.ap_selection.rss.get_rss_data(database, database_keys, bands = 3)
+        if rss_data is not None:
+            inputs['rss'] = rss_data.sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
+
+    for config in [ c for c in configs if c['method'] == 'cell-history' ]:
+        key = (config['metric'], float(config['cell-size']))
+        if key not in inputs['gps']:
+            inputs['gps'][key] = analysis.trace.utils.data.merge_gps(input_dir, trace_nr, key[0], cell_size = key[1])
+
+    return inputs
+
+def get_selection(config, inputs):
+
+    method = config['method']
+    if method in ['strongest-rss', 'smoothed-hysteresis']:
+
+        if inputs['rss'] is None:
+            return None
+
+        # same data as get_rss_data(bands = config['bands']), w/o reading the ap matrix again
+        aps = analysis.trace.ap_selection.rss.get_aps(config['bands'])
+        rss_data = inputs['rss'][['timed-tmstmp'] + aps]
+        rss_data = rss_data.dropna(subset = aps, how = 'all').reset_index(drop = True)
+
+        if method == 'strongest-rss':
+            return analysis.trace.ap_selection.rss.strongest_rss_selection(rss_data, aps,
+                scan_period = config['scan-period'], scan_time = config['scan-time'])
+        else:
+            selection = analysis.trace.ap_selection.rss.smoothed_hysteresis_selection(rss_data, aps,
+                w = config['w'], hysteresis = config['hysteresis'])
+            return selection[selection['best'] != -1].reset_index(drop = True)
+
+    elif method == 'cell-history':
+        data = inputs['gps'][(config['metric'], float(config['cell-size']))]
+        return analysis.trace.ap_selection.gps.cell_history_selection(data.copy(), config)
+
+    else:
+        sys.stderr.write("""[ERROR] unknown ap selection method : %s\n""" % (method))
+        return None
+
+def evaluate(config, inputs):
+
+    # apply a single configuration and summarize its performance
+    selection = get_selection(config, inputs)
+    res = {'method' : config['method'], 'config' : get_config_str(config)}
+    if (selection is None) or selection.empty:
+        res.update({'samples' : 0, 'handoffs' : 0, 'mean' : np.nan, 'median' : np.nan, 'total' : np.nan})
+        return res
+
+    metric = inputs['metric']
+    sel_perf = analysis.trace.ap_selection.utils.get_performance(selection[['timed-tmstmp', 'best']], inputs['perf'], metric, nodes = inputs['nodes'])
+    res.update({
+        'samples' : len(sel_perf),
+        'handoffs' : int((sel_perf['best'] != sel_perf['best'].shift(1)).sum()) - 1 if len(sel_perf) else 0,
+        'mean' : sel_perf[metric].mean(),
+        'median' : sel_perf[metric].median(),
+        'total' : sel_perf[metric].sum()})
+
+    return res
+
+def _init_worker(inputs):
+    global _inputs
+    _inputs = inputs
+
+def _evaluate(config):
+    return evaluate(config, _inputs)
+
+def sweep(input_dir, trace_nr, configs, metric = 'throughput', processes = 1, force_calc = False):
+
+    # evaluate a list of ap selection configurations (e.g. from get_grid()) and save
+    # a table w/ one row per configuration in /selection-sweep/<metric>
+    trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
+    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
+    database_keys = utils.hdfs.get_db_keys(trace_dir)
+
+    sweep_db = ('/selection-sweep/%s' % (metric))
+    if sweep_db in database_keys:
+        if force_calc:
+            utils.hdfs.remove_dbs(trace_dir, dbs = [sweep_db])
+        else:
+            sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (sweep_db))
+            return database.select(sweep_db)
+
+    start_time = timeit.default_timer()
+    inputs = get_inputs(input_dir, trace_nr, configs, metric = metric)
+    sys.stderr.write("""[INFO] loaded sweep inputs in %.3f sec\n""" % (timeit.default_timer() - start_time))
+
+    start_time = timeit.default_timer()
+    if processes > 1:
+        pool = mp.Pool(processes = processes, initializer = _init_worker, initargs = (inputs,))
+        try:
+            results = pool.map(_evaluate, configs)
+        except BaseException:
+            # a config failed : stop the pool w/o waiting for the other configs
+            pool.terminate()
+            pool.join()
+            raise
+        pool.close()
+        pool.join()
+    else:
+        results = [ evaluate(config, inputs) for config in configs ]
+    sys.stderr.write("""[INFO] evaluated %d configurations in %.3f sec\n""" % (len(configs), timeit.default_timer() - start_time))
+
+    results = pd.DataFrame(results, columns = ['method', 'config', 'samples', 'handoffs', 'mean', 'median', 'total'])
+    results = results.sort_values(by = ['method', 'mean'], ascending = [True, False]).reset_index(drop = True)
+    utils.hdfs.to_hdfs(results, sweep_db, database)
+
+    return results
@@ -22,7 +22,8 @@ import sys
 # custom imports
 #   - hdfs utils
 import utils.hdfs
-# #   - analysis
+#   - analysis
+import analysis.trace.utils.data
 # import analysis.utils.metrics
 # import analysis.utils.data
 # import analysis.gps
@@ -30,6 +31,22 @@ import utils.hdfs
 # import analysis.ap_selection.gps
 # import analysis.ap_selection.utils
 
+def get_performance(sel_data, perf_data, metric, nodes = ['m1', 'w1', 'w2', 'w3']):
+
+    # performance of a selection plan, i.e. the value of <metric> of the 'best' node 
+    # of each 'timed-tmstmp' in sel_data, according to perf_data (e.g. /best/<metric>).
+    # rows w/ no selected node are left out, rows w/ no perf data get 0.0
+    sel_data = sel_data[sel_data['best'].isin(nodes)]
+    if metric in sel_data.columns:
+        sel_data = sel_data.drop(columns = [metric])
+
+    perf_data = perf_data.melt(id_vars = ['timed-tmstmp'], value_vars = nodes, var_name = 'best', value_name = metric)
+    sel_perf = pd.merge(sel_data, perf_data, on = ['timed-tmstmp', 'best'], how = 'left')
+
+    sel_perf = sel_perf.sort_values(by = ['timed-tmstmp'], kind = 'mergesort').reset_index(drop = True)
+    sel_perf[metric] = sel_perf[metric].fillna(0.0)
+    return sel_perf
+
 def extract_performance(
     input_dir, trace_nr,
     db_selection,
@@ -45,7 +62,7 @@ def extract_performance(
     if perf_db in database_keys:
         if force_calc:
             # database.remove(perf_db)
-            utils.hdfs.remove_dbs(trace_dir, [perf_db])
+            utils.hdfs.remove_dbs(trace_dir, dbs = [perf_db])
         else:
             sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (perf_db))
             return
@@ -59,27 +76,8 @@ def extract_performance(
     # sel_data['timed-tmstmp-str'] = sel_data['timed-tmstmp'].astype(str)
 
     # calculate selection performance data
-    sel_perf = pd.DataFrame()
     nodes = ['m1', 'w1', 'w2', 'w3']
-    base_db = analysis.trace.extract_best(input_dir, trace_nr, metric)
-    perf_data = database.select(base_db)[['timed-tmstmp'] + nodes].sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
-    for node in nodes:
-
-        # filter selection data by node
-        sd = sel_data[sel_data['best'] == node]
-        if sd.empty:
-            continue
-        # get performance data for node
-        perfd = perf_data[['timed-tmstmp', node]]
-        perfd[metric] = perfd[node]
-        if perfd.empty:
-            continue
-
-        # merge perf metric data w/ the selection plan
-        sp = pd.merge(sd, perfd[ ['timed-tmstmp', metric] ], on = ['timed-tmstmp'], how = 'left')
-        # concat in total selection performance df
-        sel_perf = pd.concat([sel_perf, sp], ignore_index = True)
-
-    sel_perf = sel_perf.sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
-    sel_perf[metric] = sel_perf[metric].fillna(0.0)
+    base_db = analysis.trace.utils.data.extract_best(input_dir, trace_nr, metric)
+    perf_data = database.select(base_db, columns = ['timed-tmstmp'] + nodes).sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
+    sel_perf = get_performance(sel_data, perf_data, metric, nodes = nodes)
     utils.hdfs.to_hdfs(sel_perf, ('/selection-performance/%s/%s' % (metric, db_selection.replace('/selection/', ''))), database)
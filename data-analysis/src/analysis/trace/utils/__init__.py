@@ -15,6 +15,8 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import absolute_import
 
+import analysis.trace.utils.intervals
 import analysis.trace.utils.data
 import analysis.trace.utils.gps
 import analysis.trace.utils.metrics
+import analysis.trace.utils.buckets
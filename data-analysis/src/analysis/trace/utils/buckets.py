@@ -0,0 +1,63 @@
+# buckets.py : vectorized time bucketing (e.g., 'timed-tmstmp' of .5 sec intervals)
+# Copyright (C) 2018  adamiaonr@cmu.edu
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import absolute_import
+
+import pandas as pd
+import numpy as np
+import sys
+
+def _round_half_away(x):
+    # python 2's round(), i.e. ties away from zero (np.rint() rounds ties to even)
+    x = np.asarray(x, dtype = float)
+    trunc = np.trunc(x)
+    return np.where(np.abs(x - trunc) == 0.5, trunc + np.sign(x), np.rint(x))
+
+# bucket alignments:
+#   - 'round' : nearest bucket, w/ ties rounded as the built-in round() of the running 
+#     interpreter (to even in python 3, away from zero in python 2), so that results are 
+#     the same as custom_round()'s. e.g. w/ width = .5, 10.2 -> 10.0 and 10.3 -> 10.5.
+#   - 'floor' : bucket which contains the value, e.g. w/ width = .5, 10.3 -> 10.0
+#   - 'ceil' : next bucket, e.g. w/ width = .5, 10.2 -> 10.5
+ALIGNS = {
+    'round' : np.rint if (sys.version_info[0] >= 3) else _round_half_away,
+    'floor' : np.floor,
+    'ceil' : np.ceil
+}
+
+def get_prec(width):
+    # nr. of decimal places of a bucket width, e.g. .5 -> 1, .25 -> 2, 1.0 -> 0
+    dec = repr(float(width)).split('.')[-1].rstrip('0')
+    return len(dec) if 'e' not in dec else 6
+
+def _scale(x, width, align, origin):
+    return ALIGNS[align]((np.asarray(x, dtype = float) - origin) / width)
+
+def get_ids(x, width = 0.5, align = 'round', origin = 0.0):
+    # int64 bucket ids, i.e. nr. of bucket widths since origin. x must not have nan values.
+    return _scale(x, width, align, origin).astype(np.int64)
+
+def get_tmstmps(ids, width = 0.5, origin = 0.0, prec = None):
+    # start timestamps of bucket ids, rounded to the nr. of decimal places of width
+    if prec is None:
+        prec = get_prec(width)
+    return np.round(origin + (np.asarray(ids, dtype = float) * width), prec)
+
+def bucketize(x, width = 0.5, align = 'round', origin = 0.0, prec = None):
+    # vectorized version of custom_round(), i.e. get_tmstmps(get_ids(x)), which keeps nan values.
+    # e.g. data['timed-tmstmp'] = bucketize(data['epoch time'])
+    if prec is None:
+        prec = get_prec(width)
+    return np.round(origin + (_scale(x, width, align, origin) * width), prec)
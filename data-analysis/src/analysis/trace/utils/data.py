@@ -18,9 +18,11 @@ from __future__ import absolute_import
 import pandas as pd
 import numpy as np
 import os
+import io
 import sys
 import glob
 import datetime
+import multiprocessing as mp
 
 # custom imports
 #   - hdfs utils
@@ -29,6 +31,7 @@ import utils.hdfs
 import utils.ieee80211
 #   - mapping utils
 import utils.mapping.utils
+import utils.mapping.grid
 #   - analysis
 import analysis.trace
 
@@ -208,29 +211,42 @@ def aggregate_csv(input_dir, trace_nr, prefix = 'cbt', nodes = ['ap1', 'ap2', 'a
     node_info = get_node_info(input_dir, trace_nr)
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
 
-    data = pd.DataFrame()
+    data = []
     for node in nodes:
         # dir w/ multiple .csv files named w/ pattern <node>.*.csv
         csv_dir = os.path.join(trace_dir, ("%s" % (node)))
-        for filename in sorted(glob.glob(os.path.join(csv_dir, ('%s.*.csv' % (prefix))))):
+        for f, filename in enumerate(sorted(glob.glob(os.path.join(csv_dir, ('%s.*.csv' % (prefix)))))):
             
             # read .csv file
             _data = pd.read_csv(filename)
-            # if prefix is 'cbt', pre-processing required
-            if prefix == 'cbt':
-                laps = extract_laps(input_dir, trace_nr)
-                _data = analysis.trace.utils.metrics.get_channel_util(_data, timestamps = [laps.iloc[0]['start-time'], laps.iloc[-1]['end-time']])
-            
             # add node id and mac addr columns
             _data['id'] = node
             _data['mac-addr'] = ''
             if node in node_info['id'].tolist():
                 _data['mac-addr'] = node_info[node_info['id'].str.contains(node)].iloc[0]['mac-addr']
-                
-            # append to aggregated .csv file
-            data = pd.concat([_data, data], ignore_index = True)
-            
+            # keep track of the file each row came from, since counters 
+            # aren't continuous across files
+            _data['file-nr'] = f
+
+            # prepend to aggregated .csv file
+            data.insert(0, _data)
+
+    data = pd.concat(data, ignore_index = True) if data else pd.DataFrame()
+    # if prefix is 'cbt', pre-processing required : 
+    # calc channel util. for all nodes and files at once
+    if (prefix == 'cbt') and (not data.empty):
+        # only keep samples collected during laps, if laps.csv is available
+        laps = analysis.trace.utils.gps.get_laps(trace_dir)
+        timestamps = []
+        if not laps.empty:
+            timestamps = [laps.iloc[0]['start-time'], laps.iloc[-1]['end-time']]
+        data = analysis.trace.utils.metrics.get_channel_util(data, 
+            timestamps = timestamps,
+            groupby = ['id', 'file-nr'])
+
     # save aggrgated .csv file
+    if 'file-nr' in data.columns:
+        data = data.drop(columns = ['file-nr']).reset_index(drop = True)
     data.to_csv(os.path.join(trace_dir, ("%s.csv" % (prefix))), sep = ',')
     
 def load_best(database, metric):
@@ -289,23 +305,23 @@ def get_info(input_dir, trace_nr, mode = 'rx'):
     trace_info = pd.DataFrame()
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database_file = os.path.join(trace_dir, "processed/database.hdf5")
-    if not os.path.isfile(database_file):
+    database_file = utils.hdfs.get_db_path(trace_dir, 'database.hdf5')
+    if not os.path.exists(database_file):
         sys.stderr.write("""%s: [ERROR] no .hdf5 available at %s\n""" % (sys.argv[0], trace_dir))
         # return empty dataframe
         return trace_info
 
-    database = pd.HDFStore(os.path.join(trace_dir, "processed/database.hdf5"))
+    with utils.hdfs.db(trace_dir, 'database.hdf5', mode = 'r') as database:
 
-    database_name = ('/%s/%s' % ('dataset-stats', mode))
-    if database_name not in database.keys():
-        sys.stderr.write("""%s: [ERROR] no dataset stats available yet\n""" % (sys.argv[0]))
-        # return empty dataframe
-        return trace_info
+        database_name = ('/%s/%s' % ('dataset-stats', mode))
+        if database_name not in database.keys():
+            sys.stderr.write("""%s: [ERROR] no dataset stats available yet\n""" % (sys.argv[0]))
+            # return empty dataframe
+            return trace_info
 
-    # load trace data into dataframe and return
-    trace_info = database.select(database_name)
-    return trace_info
+        # load trace data into dataframe and return
+        trace_info = database.select(database_name)
+        return trace_info
 
 def get_node_info(input_dir, trace_nr):
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
@@ -314,14 +330,14 @@ def get_node_info(input_dir, trace_nr):
 def merge_gps(input_dir, trace_nr, metric, cell_size = 20.0):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = pd.HDFStore(os.path.join(trace_dir, "processed/database.hdf5"))
+    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
 
     #   - get /best/<metric>
     base_db = analysis.trace.utils.data.extract_best(input_dir, trace_nr, metric)
     nodes = ['m1', 'w1', 'w2', 'w3']
-    data = database.select(base_db)[['timed-tmstmp'] + nodes].sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
+    data = database.select(base_db, columns = ['timed-tmstmp'] + nodes).sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
     #   - get gps data
-    gps_data = analysis.gps.get_data(input_dir, trace_dir)
+    gps_data = analysis.trace.utils.gps.get_data(input_dir, trace_dir)
     gps_data['timed-tmstmp'] = gps_data['timestamp'].astype(float)
     # merge /best/<metric> & gps data
     data = pd.merge(data, gps_data[['timed-tmstmp', 'lat', 'lon']], on = ['timed-tmstmp'], how = 'left')
@@ -329,62 +345,142 @@ def merge_gps(input_dir, trace_nr, metric, cell_size = 20.0):
     analysis.trace.utils.data.fix_gaps(data, subset = ['lat', 'lon'])
     data = data.dropna(subset = ['lat', 'lon']).reset_index(drop = True)
     # add cell info
-    analysis.gps.add_cells(data, cell_size = cell_size, bbox = [LONW, LATS, LONE, LATN])
+    utils.mapping.grid.get_grid([LONW, LATS, LONE, LATN], cell_size).add_cells(data)
 
     return data
 
-def extract_bitrates(input_dir, trace_nr, protocol = 'udp', time_delta = 0.5, force_calc = False):
+def _get_csv_chunks(filename, chunksize = 2 ** 25):
+
+    # split a .csv file in byte ranges of ~chunksize bytes, aligned w/ line ends,
+    # so that each range can be parsed independently by a different process
+    chunks = []
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        # skip header
+        f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunksize, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            chunks.append((filename, start, end))
+            start = end
+
+    return chunks
+
+def _extract_bitrates_chunk(args):
+
+    filename, start, end, protocol = args
+
+    cols = ['epoch time', 'ip proto', 'frame len', 'wlan data rate']
+    with open(filename, 'rb') as f:
+        header = pd.read_csv(f, nrows = 0).columns.tolist()
+        f.seek(start)
+        chunk = pd.read_csv(io.BytesIO(f.read(end - start)), header = None, names = header, usecols = cols)
+
+    return _get_bitrate_sums(chunk, protocol)
+
+def _extract_bitrates_pcap(args):
+
+    # same as _extract_bitrates_chunk(), for a monitor*.pcap file read w/o tshark
+    filename, protocol = args
+
+    data = [ _get_bitrate_sums(batch, protocol) for batch in utils.ieee80211.pcap.read_pcap(filename, columns = ['epoch time', 'ip proto', 'frame len', 'wlan data rate']) ]
+    if not data:
+        return pd.DataFrame(columns = ['timed-tmstmp', 'frame len', 'wlan data rate', 'wlan data rate cnt'])
+
+    return pd.concat(data, ignore_index = True).groupby(['timed-tmstmp']).sum().reset_index()
+
+def _get_bitrate_sums(chunk, protocol):
+
+    # extract wlan data frame data
+    qos_data = chunk[ (chunk['ip proto'] == protocol.upper()) ]
+    # analyze for intervals of .5 seconds
+    qos_data = pd.DataFrame({
+        'timed-tmstmp' : analysis.trace.utils.buckets.bucketize(qos_data['epoch time'].values, width = 0.5),
+        'frame len' : qos_data['frame len'].values.astype(float),
+        'wlan data rate' : qos_data['wlan data rate'].values.astype(float)})
+
+    # return partial sums (rather than means) per interval, so that intervals 
+    # which straddle chunk boundaries can be merged later
+    qos_data['wlan data rate cnt'] = (~qos_data['wlan data rate'].isnull()).astype(int)
+    return qos_data.groupby(['timed-tmstmp']).sum().reset_index()
+
+def _run_task(args):
+    func, func_args = args
+    return func(func_args)
+
+def extract_bitrates(input_dir, trace_nr, protocol = 'udp', time_delta = 0.5, force_calc = False, processes = 1, chunksize = 2 ** 25):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = pd.HDFStore(os.path.join(trace_dir, "processed/database.hdf5"))
+    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
     # FIXME : this should be loaded from a file
     nodes = ['m1', 'w1', 'w2', 'w3']
-    for node in nodes:
+    for node in list(nodes):
         for sub_type in ['beacons', 'bitrates']:
             db = ('/%s/%s/%s' % (node, 'basic', sub_type))
             if db in database.keys():
                 if force_calc:
-                    database.remove(db)
+                    utils.hdfs.remove_db(database, db)
                 else:
                     sys.stderr.write("""[WARNING] %s already in database. skipping data extraction for node %s.\n""" % (db, node))
                     if node in nodes:
                         nodes.remove(node)
 
+    # fan out the chunks of all monitor*.csv files of all nodes. 
+    # nodes w/o monitor*.csv files use their monitor*.pcap files instead (one task per file).
+    tasks = []
+    for node in nodes:
+        csv_files = sorted(glob.glob(os.path.join(trace_dir, ('%s/monitor*.csv' % (node)))))
+        for filename in csv_files:
+            tasks += [ (node, (_extract_bitrates_chunk, (fn, start, end, protocol))) for fn, start, end in _get_csv_chunks(filename, chunksize = chunksize) ]
+
+        if not csv_files:
+            for filename in sorted(glob.glob(os.path.join(trace_dir, ('%s/monitor*.pcap' % (node))))):
+                tasks.append((node, (_extract_bitrates_pcap, (filename, protocol))))
+
+    if processes > 1:
+        pool = mp.Pool(processes = processes)
+        try:
+            results = pool.map(_run_task, [ t[1] for t in tasks ])
+        except BaseException:
+            # a worker failed (e.g. on a bad monitor.csv) : stop the pool w/o waiting for the other tasks
+            pool.terminate()
+            pool.join()
+            raise
+        pool.close()
+        pool.join()
+    else:
+        results = [ _run_task(t[1]) for t in tasks ]
+
     for node in nodes:
-        for filename in sorted(glob.glob(os.path.join(trace_dir, ('%s/monitor*.csv' % (node))))):
-
-            chunksize = 10 ** 5
-            for chunk in pd.read_csv(filename, chunksize = chunksize):
-
-                # # extract beacon frames & store them directly in database
-                # beacon_data = chunk[ (chunk['wlan type-subtype'] == 'Beacon frame') ][['epoch time', 'wlan tsf time', 'wlan rssi', 'wlan data rate', 'wlan seq number']].reset_index(drop = True)
-                # beacon_data['wlan data rate'] = beacon_data['wlan data rate'].astype(float)
-                # utils.hdfs.to_hdfs(beacon_data, ('/%s/%s/%s' % (node, 'basic', 'beacons')), database)
-
-                # extract wlan data frame data
-                qos_data = chunk[ (chunk['ip proto'] == protocol.upper()) ].reset_index(drop = True)
-                # analyze for intervals of .5 seconds
-                qos_data['timed-tmstmp'] = qos_data['epoch time'].apply(analysis.trace.utils.metrics.custom_round)
-                # get interval timestamps for later merge
-                proc_qos_data = qos_data[['timed-tmstmp']].drop_duplicates().reset_index(drop = True)
-                # calculate each metric, and merge according to timed-tmstmp 
-                for metric in ['throughput', 'wlan data rate']:
-                    res = analysis.trace.utils.metrics.process_metric(qos_data, metric, time_delta = time_delta)
-                    proc_qos_data = pd.merge(proc_qos_data, res, on = ['timed-tmstmp'], how = 'left')
-
-                # save bitrates in database
-                utils.hdfs.to_hdfs(proc_qos_data, ('/%s/%s/%s' % (node, 'basic', 'bitrates')), database)
+
+        proc_qos_data = [ res for t, res in zip(tasks, results) if t[0] == node ]
+        if not proc_qos_data:
+            continue
+
+        # merge intervals split across chunks, and calc metrics:
+        #   - throughput : sum of frame len, in bps
+        #   - wlan data rate : mean wlan data rate, in bps
+        proc_qos_data = pd.concat(proc_qos_data, ignore_index = True).groupby(['timed-tmstmp']).sum().reset_index()
+        proc_qos_data['throughput'] = (proc_qos_data['frame len'] * 8.0) / time_delta
+        proc_qos_data['wlan data rate'] = (proc_qos_data['wlan data rate'] / proc_qos_data['wlan data rate cnt']) * 1000000.0
+
+        # save bitrates in database
+        utils.hdfs.to_hdfs(proc_qos_data[['timed-tmstmp', 'frame len', 'throughput', 'wlan data rate']], ('/%s/%s/%s' % (node, 'basic', 'bitrates')), database)
+        remove_ap_matrices(database, [('/%s/%s/%s' % (node, 'basic', 'bitrates'))])
 
 def extract_distances(input_dir, trace_nr, time_delta = 0.5, force_calc = False):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = pd.HDFStore(os.path.join(trace_dir, "processed/database.hdf5"))
+    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
 
     db_name = ('/%s/%s' % ('gps', 'distances'))
     if db_name in database.keys():
         
         if force_calc:
-            database.remove(db_name)
+            utils.hdfs.remove_db(database, db_name)
         else:
             return
 
@@ -399,23 +495,27 @@ def extract_distances(input_dir, trace_nr, time_delta = 0.5, force_calc = False)
         'p2' : {'lat' : 41.178518, 'lon' : -8.595366}, 
         'ref' : ref
     }
-    pos = [ [ row['lat'], row['lon'] ] for index, row in gps_data[['lat', 'lon']].iterrows() ]
-    for ap in ap_pos:
-        gps_data[ap] = [ utils.mapping.utils.gps_to_dist(ap_pos[ap]['lat'], ap_pos[ap]['lon'], p[0], p[1]) for p in pos ]
+    aps = list(ap_pos.keys())
+    dist = utils.mapping.utils.gps_to_dist_matrix(gps_data['lat'].values, gps_data['lon'].values, 
+        [ ap_pos[ap]['lat'] for ap in aps ], [ ap_pos[ap]['lon'] for ap in aps ])
+    # one column at a time, since older pandas can't assign to a list of new columns
+    for i, ap in enumerate(aps):
+        gps_data[ap] = dist[:, i]
 
     gps_data = gps_data.sort_values(by = ['timestamp']).reset_index(drop = True)
     utils.hdfs.to_hdfs(gps_data[['timestamp', 'lat', 'lon', 'lap', 'direction'] + list(ap_pos.keys())], db_name, database)
+    remove_ap_matrices(database, [db_name])
 
 def extract_channel_util(input_dir, trace_nr, time_delta = 0.5, force_calc = False):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = pd.HDFStore(os.path.join(trace_dir, "processed/database.hdf5"))
+    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
 
     db_name = ('/%s/%s' % ('basic', 'channel-util'))
     if db_name in database.keys():
         
         if force_calc:
-            database.remove(db_name)
+            utils.hdfs.remove_db(database, db_name)
         else:
             return
 
@@ -462,35 +562,36 @@ def extract_channel_util(input_dir, trace_nr, time_delta = 0.5, force_calc = Fal
 def extract_beacon_features(input_dir, trace_nr, force_calc = True):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = pd.HDFStore(os.path.join(trace_dir, "processed/database.hdf5"))
+    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
 
     for node in ['m1', 'w1', 'w2', 'w3']:
 
         db_name = ('/%s/%s/%s' % (node, 'basic', 'beacons'))
         if db_name in database:
             if force_calc:
-                database.remove(db_name)
+                utils.hdfs.remove_db(database, db_name)
             else:
                 return
 
         beacons = pd.read_csv(os.path.join(trace_dir, '%s/beacons.csv' % (node)))
         # add .5 precision timestamp
-        beacons['timed-tmstmp'] = beacons['epoch time'].apply(analysis.trace.utils.metrics.custom_round)
+        beacons['timed-tmstmp'] = analysis.trace.utils.buckets.bucketize(beacons['epoch time'].values, width = 0.5)
         beacons = beacons.reset_index(drop = True)
 
         # select subset of features
-        # some features require decoding w/ specified function
+        # some features require decoding, either w/ a table of bit fields 
+        # (decoded column-at-a-time) or w/ a specified function
         subset = {
             'timed-tmstmp' : None, 
             'wlan rssi' : None, 
             'wlan ds current channel' : None, 
             'wlan ht supported channel width' : utils.ieee80211.beacon.decode_ht_supported_channel_width,
-            'wlan ht capabilities' : utils.ieee80211.beacon.decode_ht_capabilities, 
-            'wlan ht a-mpdu' : utils.ieee80211.beacon.decode_ht_ampdu, 
-            'wlan ht info subset 1' : utils.ieee80211.beacon.decode_ht_info_subset, 
+            'wlan ht capabilities' : utils.ieee80211.beacon.HT_CAPABILITIES, 
+            'wlan ht a-mpdu' : utils.ieee80211.beacon.HT_AMPDU, 
+            'wlan ht info subset 1' : utils.ieee80211.beacon.HT_INFO_SUBSET_1, 
             # 'wlan beacon interval' : 1, 
             # 'wlan beacon timestamp' : 0,
-            'wlan vht  capabilities' : utils.ieee80211.beacon.decode_vht_capabilities,
+            'wlan vht  capabilities' : utils.ieee80211.beacon.VHT_CAPABILITIES,
             'wlan vht op channel width' : utils.ieee80211.beacon.decode_vht_op_channel_width, 
             'wlan vht channel op center seg 0' : None, 
             'wlan vht channel op center seg 1' : None, 
@@ -510,14 +611,18 @@ def extract_beacon_features(input_dir, trace_nr, force_calc = True):
 
             to_remove.append(feature)
 
-            res = pd.DataFrame(beacons[feature].apply(lambda x : subset[feature](x)).tolist())
-            to_merge[list(res.columns)] = res
+            if isinstance(subset[feature], dict):
+                res = utils.ieee80211.beacon.decode_column(beacons[feature], subset[feature])
+            else:
+                res = pd.DataFrame(beacons[feature].apply(lambda x : subset[feature](x)).tolist())
+            to_merge = pd.concat([to_merge, res.reset_index(drop = True)], axis = 1)
 
         beacons[list(to_merge.columns)] = to_merge
         columns = [x for x in list(beacons.columns) if x not in to_remove]
         beacons = beacons[columns].reset_index(drop = True)
         
         utils.hdfs.to_hdfs(beacons, db_name, database)
+        remove_ap_matrices(database, [db_name])
 
 def get_data(node, metric, database):
 
@@ -526,16 +631,16 @@ def get_data(node, metric, database):
         db_name = ('/%s/%s/%s' % (node, 'basic', 'bitrates'))
         if db_name not in database.keys():
             return None
-        data = database.select(db_name)[['timed-tmstmp', metric]].sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
+        data = database.select(db_name, columns = ['timed-tmstmp', metric]).sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
 
     elif metric == 'rss':
         db_name = ('/%s/%s/%s' % (node, 'basic', 'beacons'))
         if db_name not in database.keys():
             return None
 
-        data = database.select(db_name)[['epoch time', 'wlan rssi']].sort_values(by = ['epoch time']).reset_index(drop = True)
+        data = database.select(db_name, columns = ['epoch time', 'wlan rssi']).sort_values(by = ['epoch time']).reset_index(drop = True)
         data.rename(index = str, columns = {'wlan rssi' : metric}, inplace = True)
-        data['timed-tmstmp'] = data['epoch time'].apply(analysis.metrics.custom_round)
+        data['timed-tmstmp'] = analysis.trace.utils.buckets.bucketize(data['epoch time'].values, width = 0.5)
         data = data[['timed-tmstmp', 'rss']].groupby(['timed-tmstmp']).max().reset_index().sort_values(by = ['timed-tmstmp'])
 
     elif metric == 'distances':
@@ -553,41 +658,103 @@ def get_data(node, metric, database):
 
     return data
 
+# version of the ap matrix calculation. bump it when get_data() or 
+# get_ap_matrix() change, so that cached ap matrices are re-calculated
+AP_MATRIX_VERSION = 1
+
+def get_ap_matrix_sources(metric, nodes = ['m1', 'w1', 'w2', 'w3']):
+    # tables an ap matrix is calculated from
+    if metric in ['throughput', 'wlan data rate']:
+        return [ ('/%s/%s/%s' % (node, 'basic', 'bitrates')) for node in nodes ]
+    elif metric == 'rss':
+        return [ ('/%s/%s/%s' % (node, 'basic', 'beacons')) for node in nodes ]
+    elif metric == 'distances':
+        return [ ('/%s/%s' % ('gps', 'distances')) ]
+    else:
+        return []
+
+def remove_ap_matrices(database, sources):
+
+    # drop the cached ap matrices calculated from any of sources. called by the extractors when
+    # they (re-)write a source table, since a source re-written w/ the same nr. of rows 
+    # (e.g. w/ other parameters) would otherwise go unnoticed by get_ap_matrix()
+    database_keys = database.keys()
+    for metric in ['throughput', 'wlan data rate', 'rss', 'distances']:
+        db_name = ('/%s/%s' % ('ap-matrix', metric))
+        if (db_name in database_keys) and (set(sources) & set(get_ap_matrix_sources(metric))):
+            utils.hdfs.remove_db(database, db_name)
+
+def get_ap_matrix(database, metric, force_calc = False):
+
+    # 'ap matrix' of a trace, i.e. a dataframe w/ columns ['timed-tmstmp', 'm1', 'w1', 'w2', 'w3'], 
+    # w/ the value of <metric> of each node per 'timed-tmstmp' (nan if not available).
+    # calculated once per trace and cached in /ap-matrix/<metric>. the cache is invalidated if 
+    # AP_MATRIX_VERSION changes, if the nr. of rows of the source tables changes, or if 
+    # an extractor re-writes a source table (see remove_ap_matrices()).
+    nodes = ['m1', 'w1', 'w2', 'w3']
+    db_name = ('/%s/%s' % ('ap-matrix', metric))
+    info_db = ('/%s/%s' % ('ap-matrix', 'info'))
+    database_keys = database.keys()
+
+    sources = ','.join([ ('%s:%s' % (src, utils.hdfs.get_nrows(database, src))) for src in get_ap_matrix_sources(metric, nodes) if src in database_keys ])
+    info = database.select(info_db) if info_db in database_keys else pd.DataFrame(columns = ['metric', 'version', 'sources'])
+
+    if db_name in database_keys:
+        _info = info[info['metric'] == metric]
+        if (not force_calc) and (not _info.empty) and (int(_info.iloc[-1]['version']) == AP_MATRIX_VERSION) and (_info.iloc[-1]['sources'] == sources):
+            return database.select(db_name)
+
+        utils.hdfs.remove_db(database, db_name)
+
+    # build the matrix from all nodes at once, rather than merging one node at a time
+    data = []
+    for node in nodes:
+        _data = get_data(node, metric, database)
+        if (_data is None) or _data.empty:
+            continue
+        _data = _data[['timed-tmstmp', metric]].drop_duplicates(subset = ['timed-tmstmp'])
+        _data['node'] = node
+        data.append(_data)
+
+    if not data:
+        return pd.DataFrame(columns = ['timed-tmstmp'] + nodes)
+
+    data = pd.concat(data, ignore_index = True).pivot(index = 'timed-tmstmp', columns = 'node', values = metric)
+    data = data.reindex(columns = nodes).sort_index().reset_index(drop = False)
+    data.columns.name = None
+    data[nodes] = data[nodes].astype(float)
+
+    utils.hdfs.to_hdfs(data, db_name, database)
+
+    # update cache info of <metric>
+    info = info[info['metric'] != metric]
+    info = pd.concat([info, pd.DataFrame([{'metric' : metric, 'version' : AP_MATRIX_VERSION, 'sources' : sources}])], ignore_index = True)
+    if info_db in database_keys:
+        utils.hdfs.remove_db(database, info_db)
+    utils.hdfs.to_hdfs(info.astype({'metric' : str, 'version' : int, 'sources' : str}), info_db, database)
+
+    return data
+
 def extract_best(input_dir, trace_nr, metric = 'throughput', smoothen = False, force_calc = False):
 
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = pd.HDFStore(os.path.join(trace_dir, "processed/database.hdf5"))
+    database = utils.hdfs.get_db(trace_dir, 'database.hdf5')
     db_name = ('/%s/%s' % ('best', metric))
     if db_name in database.keys():
         if force_calc:
-            database.remove(db_name)
+            utils.hdfs.remove_db(database, db_name)
         else:
             sys.stderr.write("""[INFO] %s already in database. skipping data extraction.\n""" % (db_name))
             return db_name
 
     nodes = ['m1', 'w1', 'w2', 'w3']
-    best = pd.DataFrame(columns = ['timed-tmstmp'])
-    for node in nodes:
-
-        data = get_data(node, metric, database)
-        if data.empty:
-            continue
-
-        # update best w/ mac info
-        # FIXME: is the use of 'outer' merge correct here?
-        data[node] = data[metric]
-        best = pd.merge(best, data[ ['timed-tmstmp', node] ], on = ['timed-tmstmp'], how = 'outer')
-
-    # drop duplicate timestamps (if we merged, why should there be duplicates?)
-    best.drop_duplicates(subset = ['timed-tmstmp'], inplace = True)
-    # sort by time
-    best = best.sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
+    best = get_ap_matrix(database, metric)
     best[nodes] = best[nodes].fillna(0.0)
     
     # smoothen curves for all
     if smoothen:
         for node in nodes:
-            analysis.metrics.smoothen(best, column = node, span = 2)
+            analysis.trace.utils.metrics.smoothen(best, column = node, span = 2)
 
     # calculate the node w/ max. value at each row
     if metric == 'dist':
@@ -597,7 +764,7 @@ def extract_best(input_dir, trace_nr, metric = 'throughput', smoothen = False, f
         best['best'] = best[nodes].idxmax(axis = 1)
         best['best-val'] = best[nodes].max(axis = 1)
 
-    parsing.utils.to_hdf5(best, ('/%s/%s' % ('best', metric)), database)
+    utils.hdfs.to_hdfs(best, ('/%s/%s' % ('best', metric)), database)
     return ('/%s/%s' % ('best', metric))
 
 def get_distances(input_dir, trace_nr):
@@ -609,14 +776,14 @@ def get_distances(input_dir, trace_nr):
 
     # save data on .hdf5 database
     trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
-    database = pd.HDFStore(os.path.join(trace_dir, "processed/database.hdf5"))
+    with utils.hdfs.db(trace_dir, 'database.hdf5') as database:
 
-    dist_db = ('/%s' % ('dist-data'))
-    if dist_db not in database.keys():
-        sys.stderr.write("""[INFO] %s not in database. aborting.\n""" % (dist_db))
-        return
+        dist_db = ('/%s' % ('dist-data'))
+        if dist_db not in database.keys():
+            sys.stderr.write("""[INFO] %s not in database. aborting.\n""" % (dist_db))
+            return
 
-    return database.select(dist_db).sort_values(by = ['interval-tmstmp']).reset_index(drop = True)
+        return database.select(dist_db).sort_values(by = ['interval-tmstmp']).reset_index(drop = True)
 
 def fix_gaps(data, subset, column = 'timed-tmstmp'):
     # FIXME : still don't know how to do this without copying, hence the variable '_data'
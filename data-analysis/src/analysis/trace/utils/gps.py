@@ -18,6 +18,7 @@ from __future__ import absolute_import
 import pandas as pd
 import numpy as np
 import os
+import sys
 import glob
 import datetime
 
@@ -27,7 +28,9 @@ from collections import defaultdict
 #   - hdfs utils
 import utils.hdfs
 #   - mapping utils
-import utils.mapping.utils
+import utils.mapping.grid
+#   - analysis
+import analysis.trace.utils.intervals
 
 # north, south, west, east gps coord limits of FEUP map
 LATN = 41.176796
@@ -39,12 +42,9 @@ LAT  = (41.176796 + 41.179283) / 2.0
 LON = (-8.598336 + -8.593912) / 2.0
 
 def get_closest_cell(cell, candidates):
-    
-    cells = pd.DataFrame()
-    for c in candidates:
-        cells = cells.append({'cell-x' : c[0], 'cell-y' : c[1]}, ignore_index = True)
-    cells['diff'] = np.abs(cells['cell-x'] - cell[0]) + np.abs(cells['cell-y'] - cell[1])
-    return cells.ix[cells['diff'].idxmin()]
+    # closest candidate <cell-x, cell-y> to cell, in nr. of cells
+    closest, diff = utils.mapping.grid.get_closest_cells([cell], candidates)
+    return pd.Series({'cell-x' : closest[0][0], 'cell-y' : closest[0][1], 'diff' : diff[0]})
 
 def get_cell_datetimes(gps_data):
 
@@ -57,44 +57,22 @@ def get_cell_datetimes(gps_data):
     return sorted(timestamps)
 
 def get_cell_num(cell_size, lat = [LATN, LATS], lon = [LONW, LONE]):
-    # x-axis : longitude
-    LAT = sum(np.array(lat)) / 2.0
-    X_CELL_NUM = int(np.ceil((utils.mapping.utils.gps_to_dist(LAT, lon[0], LAT, lon[1]) / cell_size)))
-    # y-axis : latitude
-    Y_CELL_NUM = int(np.ceil((utils.mapping.utils.gps_to_dist(lat[0], 0.0, lat[1], 0.0) / cell_size)))
-    return X_CELL_NUM, Y_CELL_NUM
+    return utils.mapping.grid.get_cell_num(cell_size, lat = lat, lon = lon)
 
 def add_cells(data, cell_size, bbox = [LONW, LATS, LONE, LATN]):
-
-    lat_s = bbox[1]
-    lat_n = bbox[3]
-    lon_w = bbox[0]
-    lon_e = bbox[2]
-
-    # extract nr. of cells in the designated area
-    xx, yy = get_cell_num(cell_size = cell_size, lat = [lat_n, lat_s], lon = [lon_w, lon_e])
-    # add cell ids to data, based on [new_lat, new_lon]
-    data['cell_x'] = data['lon'].apply(lambda x : int((x - lon_w) / (lon_e - lon_w) * xx)).astype(int)
-    data['cell_y'] = data['lat'].apply(lambda y : int((y - lat_s) / (lat_n - lat_s) * yy)).astype(int)
-    # drop rows with out-of-bounds cell coords
-    data.drop(data[(data['cell_y'] < 0) | (data['cell_x'] < 0) | (data['cell_y'] > (yy - 1)) | (data['cell_x'] > (xx - 1))].index, inplace = True)
-    # it will be useful to get a single integer id
-    data['cell_id'] = (data['cell_y'].apply(lambda y : (y * xx)) + data['cell_x']).astype(int)    
+    # add ['cell_x', 'cell_y', 'cell_id'] columns to data & drop rows outside of bbox
+    utils.mapping.grid.get_grid(bbox, cell_size).add_cells(data)
 
 def update_lap_numbers(data, laps):
-    for l, row in laps.iterrows():
-
-        if row['lap'] == -1:
-            continue
-
-        data.loc[(data['timestamp'] >= row['start-time']) & (data['timestamp'] < row['end-time']), 'lap'] = row['lap'].astype(int)
-        data.loc[(data['timestamp'] >= row['start-time']) & (data['timestamp'] < row['end-time']), 'direction'] = row['direction'].astype(int)
+    # set 'lap' and 'direction' of rows w/ 'timestamp' in [start-time, end-time[ of a lap
+    laps = laps[laps['lap'] != -1]
+    analysis.trace.utils.intervals.join_intervals(data, laps, on = 'timestamp', columns = ['lap', 'direction'])
 
 def get_laps(trace_dir):
 
     filename = os.path.join(trace_dir, ("laps.csv"))
     if not os.path.isfile(filename):
-        sys.stderr.write("""%s: [ERROR] no 'laps.csv' at %s\n""" % (sys.argv[0], input_dir))
+        sys.stderr.write("""%s: [ERROR] no 'laps.csv' at %s\n""" % (sys.argv[0], trace_dir))
         # return empty dataframe
         return pd.DataFrame()
 
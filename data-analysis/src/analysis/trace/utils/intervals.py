@@ -0,0 +1,57 @@
+# intervals.py : join timestamped rows w/ time intervals (e.g., laps)
+# Copyright (C) 2018  adamiaonr@cmu.edu
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import absolute_import
+
+import pandas as pd
+import numpy as np
+
+def get_interval_idx(values, starts, ends, closed = 'left'):
+
+    # index of the interval which contains each value, or -1 if none, in O(n log m) (m : nr. of intervals).
+    # intervals are [start, end) if closed = 'left', (start, end] if closed = 'right'.
+    # FIXME : intervals must not overlap. if they do, values are matched to the interval w/ the latest start.
+    values = np.asarray(values, dtype = float)
+    starts = np.asarray(starts, dtype = float)
+    ends = np.asarray(ends, dtype = float)
+
+    order = np.argsort(starts, kind = 'mergesort')
+    if closed == 'left':
+        i = np.searchsorted(starts[order], values, side = 'right') - 1
+        match = (i >= 0) & (values < ends[order][np.maximum(i, 0)])
+    elif closed == 'right':
+        i = np.searchsorted(starts[order], values, side = 'left') - 1
+        match = (i >= 0) & (values <= ends[order][np.maximum(i, 0)])
+    else:
+        raise ValueError("""closed must be 'left' or 'right' (got '%s')""" % (closed))
+
+    return np.where(match, order[np.maximum(i, 0)], -1)
+
+def join_intervals(data, intervals, on = 'timestamp', columns = ['lap', 'direction'], start = 'start-time', end = 'end-time', closed = 'left'):
+
+    # set the columns of the rows of data w/ values of on w/in an interval to the values of that interval,
+    # e.g. join_intervals(gps_data, laps) sets the 'lap' and 'direction' of each gps row.
+    # rows outside all intervals keep their values (new columns are set to nan).
+    # same as .loc assignments per interval, but w/o iterating over the intervals.
+    idx = get_interval_idx(data[on].values, intervals[start].values, intervals[end].values, closed = closed)
+    match = (idx >= 0)
+    for c in columns:
+        values = intervals[c].values[np.maximum(idx, 0)]
+        if c in data.columns:
+            data.loc[match, c] = values[match]
+        else:
+            data[c] = np.where(match, values, np.nan)
+
+    return data
@@ -44,7 +44,7 @@ def calc_frame_duration(wlan_frames):
     duration = (( 8.0 * (wlan_frames['frame len'].values)) / wlan_frames['wlan data rate'].values) + wlan_frames['wlan preamble']
     return duration
 
-def get_channel_util(data, timestamps = []):
+def get_channel_util(data, timestamps = [], groupby = []):
     
     # reference:
     #   - cat : channel active time : amount of time in ms the radio spent on the channel
@@ -54,9 +54,10 @@ def get_channel_util(data, timestamps = []):
 
     # filter out invalid data:
     #   - invalid timestamps
+    data = data.copy()
     if timestamps:
         data['timestamp'] = data['timestamp'].astype(float)
-        data = data[(data['timestamp'] >= timestamps[0]) & (data['timestamp'] <= timestamps[1])]
+        data = data[(data['timestamp'] >= timestamps[0]) & (data['timestamp'] <= timestamps[1])].copy()
 
     data['timestamp'] = data['timestamp'].astype(int)
 
@@ -68,23 +69,21 @@ def get_channel_util(data, timestamps = []):
     # this means cat and cbt accumulate over the period.
     # after each period, the cat and cbt values overflow, and a monotonically increasing period starts again.
     
-    # as such, we calculate channel util. over segments of increasingly monotonic cat and cbt
-    segments = list(data.index[(data['cat'] - data['cat'].shift(1)) < 0.0])
-    segments.append(len(data))
-    prev_seg = 0
-    data['ch-util'] = 0.0
-    for seg in segments:
-        
-        seg_data = data.iloc[prev_seg:seg]
-        if len(seg_data) == 1:
-            continue
-        
-        # get cat and cbt per each row via the differences between consecutive acc'ed values
-        seg_data['diff-cat'] = seg_data['cat'] - seg_data['cat'].shift(1)
-        seg_data['diff-cbt'] = seg_data['cbt'] - seg_data['cbt'].shift(1)
-        
-        data.loc[prev_seg:seg, 'ch-util'] = (seg_data['diff-cbt'].astype(float) / seg_data['diff-cat'].astype(float)) * 100.0
-        data = data.dropna(subset = ['ch-util'])
+    # as such, we calculate channel util. over segments of increasingly monotonic cat and cbt.
+    # rows are diff'ed against the previous row of the same group (e.g. per ap 'id', 
+    # if groupby = ['id']), in a single pass over the whole dataframe
+    cnt = data[['cat', 'cbt']].astype(float)
+    if groupby:
+        diffs = cnt.groupby([data[c] for c in groupby], sort = False).diff()
+    else:
+        diffs = cnt.diff()
+
+    # a new segment starts at the 1st row of each group and on each cat overflow, 
+    # i.e. on a negative (or undefined) diff. the 1st row of a segment has no 
+    # previous value to diff against, so its ch. util is left as nan.
+    seg_start = ~(diffs['cat'] >= 0.0)
+    data['ch-util'] = ((diffs['cbt'] / diffs['cat']) * 100.0).where(~seg_start)
+    data = data.dropna(subset = ['ch-util'])
 
     return data
 
@@ -101,6 +100,7 @@ def add_ip_seq(data):
 
     return data
 
+# scalar version : use analysis.trace.utils.buckets.bucketize() for arrays and pd.Series
 def custom_round(x, prec = 1, base = .5):
     return round(base * round(float(x) / base), prec)
 
@@ -176,6 +176,95 @@ def calc_wlan_seq_number_stats(data, prev_seq_numbers, mode = 'rx'):
 
     return stats, _data[~_data['wlan seq number'].isin(prev_seq_numbers)]['wlan seq number'].values
 
+def get_wlan_seq_number_stats(data, mode = 'rx'):
+
+    # vectorized version of calc_wlan_seq_number_stats() over all 'timed-tmstmp' intervals at once.
+    # data must be sorted by ['epoch time', 'wlan seq number', 'wlan frag number'].
+    # returns a dataframe w/ one row per 'timed-tmstmp' interval.
+    columns = ['timed-tmstmp', 'rcvd', 'snt', 're-tx', 'lost']
+    if data.empty:
+        return pd.DataFrame(columns = columns)
+
+    # init value of the seq number of the last packet of a previous interval (as in calc_wlan_frame_stats())
+    init_seq_num = float(data['wlan seq number'].values[0]) - 1.0
+    data = data[~data['timed-tmstmp'].isnull()]
+    if data.empty:
+        return pd.DataFrame(columns = columns)
+
+    # interval indeces, in groupby() order (i.e., rows grouped by sorted 'timed-tmstmp', 
+    # w/ the order of rows within each interval preserved)
+    intervals, interval_ix = np.unique(data['timed-tmstmp'].values, return_inverse = True)
+    order = np.argsort(interval_ix, kind = 'mergesort')
+    interval_ix = interval_ix[order]
+    seq = data['wlan seq number'].values[order].astype(int)
+
+    n = len(intervals)
+    rcvd = np.bincount(interval_ix, minlength = n).astype(float)
+    retx = np.bincount(interval_ix, weights = (data['wlan retry'].values[order] == 'Frame is being retransmitted'), minlength = n)
+
+    if mode == 'tx':
+        snt = rcvd.copy()
+
+    else:
+        # cross-interval dedup:
+        # calc_wlan_seq_number_stats() ignores the seq numbers rcvd in the previous interval, 
+        # excluding those which were themselves ignored, i.e. prev[k] = seq[k] - prev[k - 1].
+        # as such, a seq number is ignored in interval k iff it shows up in an odd nr. of 
+        # consecutive intervals which end in k - 1.
+        # we find the position of each <seq number, interval> pair in its run of consecutive 
+        # intervals, and keep a row iff its position is even.
+        pairs = np.unique(np.stack((seq, interval_ix), axis = 1), axis = 0)
+        run_start = np.ones(len(pairs), dtype = bool)
+        run_start[1:] = (pairs[1:, 0] != pairs[:-1, 0]) | ((pairs[1:, 1] - pairs[:-1, 1]) != 1)
+        run_ix = np.cumsum(run_start) - 1
+        run_pos = np.arange(len(pairs)) - np.flatnonzero(run_start)[run_ix]
+        # map <seq number, interval> pairs back to rows
+        pair_ix = np.searchsorted(pairs[:, 0] * n + pairs[:, 1], seq * n + interval_ix)
+        kept = ((run_pos[pair_ix] % 2) == 0)
+
+        # 12 bit seq nums wrap around : split intervals in segments, whenever seq[i] - seq[i - 1] < -10
+        new_interval = np.ones(len(seq), dtype = bool)
+        new_interval[1:] = (interval_ix[1:] != interval_ix[:-1])
+        brk = np.zeros(len(seq), dtype = bool)
+        brk[1:] = ((seq[1:] - seq[:-1]) < -10) & (~new_interval[1:])
+        segment = np.cumsum(new_interval | brk)
+
+        # ~rcvd : sum of seq number gaps > 1, over the sorted seq numbers which are kept in each segment
+        k_segment = segment[kept]
+        k_seq = seq[kept]
+        k_interval = interval_ix[kept]
+        k_order = np.lexsort((k_seq, k_segment))
+        k_segment = k_segment[k_order]
+        k_seq = k_seq[k_order]
+        k_interval = k_interval[k_order]
+        gaps = (k_seq[1:] - k_seq[:-1] - 1).astype(float)
+        gaps[(k_segment[1:] != k_segment[:-1]) | (gaps < 0.0)] = 0.0
+        not_rcvd = np.bincount(k_interval[1:], weights = gaps, minlength = n)
+        snt = rcvd + not_rcvd
+
+        # adjust 'snt' w/ the gap in seq numbers between the 1st kept packet of an interval 
+        # and the last kept packet of the previous interval (w/ kept packets)
+        kept_ix = np.flatnonzero(kept)
+        if len(kept_ix) > 0:
+            k_interval = interval_ix[kept_ix]
+            first = np.ones(len(kept_ix), dtype = bool)
+            first[1:] = (k_interval[1:] != k_interval[:-1])
+            last = np.ones(len(kept_ix), dtype = bool)
+            last[:-1] = first[1:]
+            prev_last = np.concatenate(([init_seq_num], seq[kept_ix[last]][:-1].astype(float)))
+            interval_gap = seq[kept_ix[first]] - prev_last - 1.0
+            interval_gap[interval_gap < 0.0] = 0.0
+            snt[k_interval[first]] += interval_gap
+
+    stats = pd.DataFrame({
+        'timed-tmstmp' : intervals, 
+        'rcvd' : rcvd, 
+        'snt' : snt, 
+        're-tx' : retx})
+    stats['lost'] = (stats['snt'] - stats['rcvd']) + stats['re-tx']
+
+    return stats[columns]
+
 def calc_wlan_frame_stats(data, intervals = [1.0, .25], mode = 'rx'):
 
     # calculates stats related to wlan frame delivery, which can later be used to calc packet loss
@@ -183,45 +272,11 @@ def calc_wlan_frame_stats(data, intervals = [1.0, .25], mode = 'rx'):
     # sort by epoch time, seq num and frag num
     _data = data[['epoch time', 'timed-tmstmp', 'wlan seq number', 'wlan frag number', 'wlan retry']].sort_values(by = ['epoch time', 'wlan seq number', 'wlan frag number']).reset_index(drop = True)
 
-    # collect # of packets stats, per interval
+    # FIXME : stats are always calculated over 'timed-tmstmp' intervals, regardless of 'interval', 
+    # so we calculate them once and collect a copy per interval
+    _stats = get_wlan_seq_number_stats(_data, mode = mode)
     for interval in intervals:
-
-        # dataframe to aggregate interval stats
-        _stats = pd.DataFrame(columns = ['timed-tmstmp', 'rcvd', 'snt', 're-tx', 'lost'])
-        grouped = _data.groupby(['timed-tmstmp'])
-        # account w/ discontinuities in wlan seq numbers between intervals
-        prev_seq_num = _data.iloc[0]['wlan seq number'].astype(float) - 1
-        # useful to calc # of not rcvd packets in an interval
-        prev_seq_numbers = []
-
-        # print("total packets: %s" % (len(_data)))
-        for name, interval_data in grouped:
-
-            # print("\n\tinterval : %s" % (name))
-            # print("\tinterval.size : %s" % (len(interval_data)))
-
-            # extract interval stats from each group (update rcvd_seq_numbers)
-            interval_stats, prev_seq_numbers = calc_wlan_seq_number_stats(interval_data, prev_seq_numbers, mode)
-
-            if (mode == 'rx') and (len(prev_seq_numbers) > 0):
-                # adjust 'snt' w/ gap in wlan seq number between intervals
-                interval_gap = prev_seq_numbers[0] - prev_seq_num - 1
-                # print("\tinterval.gap : %s - %s = %s" % (prev_seq_numbers[0], prev_seq_num, interval_gap))
-                # update prev_seq_num
-                prev_seq_num = prev_seq_numbers[-1]
-                interval_stats['snt'] = (interval_stats['snt'] + interval_gap) if (interval_gap > 0) else interval_stats['snt']
-                # print("\tinterval.snt : %s" % (interval_stats['snt']))
-
-            # calc 'lost' stat w/ updated 'expected'
-            interval_stats['lost'] = (interval_stats['snt'] - interval_stats['rcvd']) + interval_stats['re-tx']
-            # print("\tinterval.lost : (%s - %s) + %s = %s" % (interval_stats['snt'], interval_stats['rcvd'], interval_stats['re-tx'], interval_stats['lost']))
-
-            _stats = _stats.append(interval_stats, ignore_index = True)
-
-        # print(stats)
-        # print(stats[['rcvd', 'snt', 'unique', 'dup', 're-tx', 'lost']].sum())
-        # print(stats[['rcvd', 'snt', 're-tx', 'lost']].sum())
-        stats[interval] = _stats
+        stats[interval] = _stats.copy()
 
     return stats
 
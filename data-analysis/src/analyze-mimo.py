@@ -23,6 +23,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import json
 import numpy as np
+import timeit
+import multiprocessing as mp
 
 from prettytable import PrettyTable
 from matplotlib.colors import BoundaryNorm
@@ -36,49 +38,178 @@ import utils.ieee80211.ac as ac
 antennas = {'4x1' : {'color' : 'red',  'label' : '4x1', 'tests' : [2, 3, 7, 8, 11]}, 
             '4x2' : {'color' : 'blue', 'label' : '4x2', 'tests' : [1, 4, 5, 6, 9, 10]}}
 
-def parse_pcaps_json(input_dir, output_dir):
-
-    bf_dir = os.path.join(input_dir, ('filtered/beamforming/json'))
-    for json_file in sorted(glob.glob(os.path.join(bf_dir, ('*.json')))):
+def read_json_packets(json_file, chunksize = 2 ** 20):
+
+    # incremental reader of tshark '-T json' dumps (i.e. a json array of packets), which yields
+    # one packet at a time w/o loading the whole file. also reads files w/ concatenated or
+    # newline-delimited json objects, e.g. '-T ek' dumps.
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    with open(json_file, 'r') as f:
+        while True:
+
+            # skip the separators between packets, i.e. '[', ',', ']' and whitespace
+            while (pos < len(buf)) and (buf[pos] in ' \t\r\n[,]'):
+                pos += 1
+
+            if pos == len(buf):
+                buf = f.read(chunksize)
+                pos = 0
+                if not buf:
+                    break
+                continue
 
-        with open(json_file, 'r') as f:
-            json_packets = json.load(f)
-            
-        data = []
-        for pkt in json_packets:
-            
-            # consider only bf reports ('Action No Ack' wlan frames)
-            if (pkt['_source']['layers']['wlan']['wlan.fc.type_subtype'] not in ['14']) or ('wlan-bf' not in pkt['_source']['layers']):
+            try:
+                pkt, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # incomplete packet at the end of the buffer : read more data
+                chunk = f.read(chunksize)
+                if not chunk:
+                    raise
+                buf = buf[pos:] + chunk
+                pos = 0
                 continue
-            
-            vht_exclusive_bf_report = ''
-            if 'wlan.vht.exclusive_beamforming_report' in pkt['_source']['layers']['wlan-bf']['Fixed parameters']:
-                vht_exclusive_bf_report = pkt['_source']['layers']['wlan-bf']['Fixed parameters']['wlan.vht.exclusive_beamforming_report'].replace(':', '')
-            
-            data.append({
-                'no' : pkt['_source']['layers']['frame']['frame.number'],
-                'epoch time' : pkt['_source']['layers']['frame']['frame.time_epoch'],
-                'frame len' : pkt['_source']['layers']['frame']['frame.len'],
-                'wlan src addr' : pkt['_source']['layers']['wlan']['wlan.ta'],
-                'wlan dst addr' : pkt['_source']['layers']['wlan']['wlan.ra'],
-                'wlan type-subtype' : pkt['_source']['layers']['wlan']['wlan.fc.type_subtype'],
-                'wlan rssi' : pkt['_source']['layers']['wlan_radio']['wlan_radio.signal_dbm'],
-                'wlan seq number' : pkt['_source']['layers']['wlan']['wlan.seq'],
-                'wlan frag number' : pkt['_source']['layers']['wlan']['wlan.frag'],
-#                'wlan spatial streams' : pkt['_source']['layers']['wlan_radio']['wlan_radio.11ac.nss'],
-                'wlan mimo nc' : int(pkt['_source']['layers']['wlan-bf']['Fixed parameters']['wlan.vht.mimo_control.control_tree']['wlan.vht.mimo_control.ncindex'], 0),
-                'wlan mimo nr' : int(pkt['_source']['layers']['wlan-bf']['Fixed parameters']['wlan.vht.mimo_control.control_tree']['wlan.vht.mimo_control.nrindex'], 0),
-                'wlan mimo feedbacktype' : int(pkt['_source']['layers']['wlan-bf']['Fixed parameters']['wlan.vht.mimo_control.control_tree']['wlan.vht.mimo_control.feedbacktype'], 0),
-                'wlan mimo codebookinfo' : int(pkt['_source']['layers']['wlan-bf']['Fixed parameters']['wlan.vht.mimo_control.control_tree']['wlan.vht.mimo_control.codebookinfo'], 0),
-                'wlan mimo grouping' : int(pkt['_source']['layers']['wlan-bf']['Fixed parameters']['wlan.vht.mimo_control.control_tree']['wlan.vht.mimo_control.grouping'], 0),
-                'wlan mimo channel width' : int(pkt['_source']['layers']['wlan-bf']['Fixed parameters']['wlan.vht.mimo_control.control_tree']['wlan.vht.mimo_control.chanwidth'], 0),
-                'wlan mimo vht compressed bf report' : pkt['_source']['layers']['wlan-bf']['Fixed parameters']['wlan.vht.compressed_beamforming_report'].replace(':', ''),
-                'wlan mimo vht exclusive bf report' : vht_exclusive_bf_report
-                })
-
-        # save as 'filtered/beamforming/csv/test<test-nr>.csv'
-        data = pd.DataFrame(data)
-        data.to_csv(os.path.join(output_dir, ("%s.csv" % (json_file.split('/')[-1].rstrip('.json')))), sep = ',')
+
+            yield pkt
+
+def get_ek_fields(pkt):
+
+    # '-T ek' records flatten the fields of each layer (incl. subtrees) into '<layer>_<field>' keys, 
+    # w/ '.' replaced by '_', e.g. {'wlan' : {'wlan_wlan_fc_type_subtype' : '14', ...}, ...}. 
+    # returns a single dict of '<field>' keys (e.g. 'wlan_fc_type_subtype'), w/ the 1st occurrence of each field, 
+    # i.e. the 1st value of list values, from the 1st layer w/ the field.
+    fields = {}
+    for layer, values in pkt['layers'].items():
+        prefix = ('%s_' % (layer))
+        for k, v in values.items():
+            if k.startswith(prefix):
+                k = k[len(prefix):]
+            # fields in more than one layer keep the value of the 1st layer
+            if k not in fields:
+                fields[k] = (v[0] if isinstance(v, list) else v)
+    return fields
+
+def get_bf_record(pkt):
+
+    # bf report of a packet of a tshark '-T json' or '-T ek' dump, None if the packet isn't one
+    if '_source' in pkt:
+        # '-T json' : {'_source' : {'layers' : {<layer> : {<field> : <value>, <subtree> : {...}}}}}
+        layers = pkt['_source'].get('layers', {})
+        if 'wlan-bf' not in layers:
+            return None
+
+        fields = {}
+        for layer in ['frame', 'wlan', 'wlan_radio']:
+            fields.update(layers.get(layer, {}))
+        bf = layers['wlan-bf']['Fixed parameters']
+        fields.update(bf)
+        fields.update(bf['wlan.vht.mimo_control.control_tree'])
+        key = (lambda f : f)
+
+    elif 'layers' in pkt:
+        fields = get_ek_fields(pkt)
+        key = (lambda f : f.replace('.', '_'))
+        if key('wlan.vht.compressed_beamforming_report') not in fields:
+            return None
+
+    else:
+        # e.g. the {'index' : {...}} lines which precede each packet in '-T ek' dumps
+        return None
+
+    # consider only bf reports ('Action No Ack' wlan frames)
+    if str(fields.get(key('wlan.fc.type_subtype'), '')) not in ['14', '0x000e']:
+        return None
+
+    field = (lambda f : fields[key(f)])
+
+    vht_exclusive_bf_report = ''
+    if key('wlan.vht.exclusive_beamforming_report') in fields:
+        vht_exclusive_bf_report = field('wlan.vht.exclusive_beamforming_report').replace(':', '')
+
+    return {
+        'no' : field('frame.number'),
+        'epoch time' : field('frame.time_epoch'),
+        'frame len' : field('frame.len'),
+        'wlan src addr' : field('wlan.ta'),
+        'wlan dst addr' : field('wlan.ra'),
+        'wlan type-subtype' : field('wlan.fc.type_subtype'),
+        'wlan rssi' : field('wlan_radio.signal_dbm'),
+        'wlan seq number' : field('wlan.seq'),
+        'wlan frag number' : field('wlan.frag'),
+#        'wlan spatial streams' : field('wlan_radio.11ac.nss'),
+        'wlan mimo nc' : int(str(field('wlan.vht.mimo_control.ncindex')), 0),
+        'wlan mimo nr' : int(str(field('wlan.vht.mimo_control.nrindex')), 0),
+        'wlan mimo feedbacktype' : int(str(field('wlan.vht.mimo_control.feedbacktype')), 0),
+        'wlan mimo codebookinfo' : int(str(field('wlan.vht.mimo_control.codebookinfo')), 0),
+        'wlan mimo grouping' : int(str(field('wlan.vht.mimo_control.grouping')), 0),
+        'wlan mimo channel width' : int(str(field('wlan.vht.mimo_control.chanwidth')), 0),
+        'wlan mimo vht compressed bf report' : field('wlan.vht.compressed_beamforming_report').replace(':', ''),
+        'wlan mimo vht exclusive bf report' : vht_exclusive_bf_report
+        }
+
+def write_batch(data, output_file, offset, output_format = 'csv'):
+
+    # append a batch of records to a .csv file or as a new part of a .parquet dir
+    data = pd.DataFrame(data)
+    data.index = data.index + offset
+    if output_format == 'parquet':
+        if not os.path.exists(output_file):
+            os.makedirs(output_file)
+        data.to_parquet(os.path.join(output_file, ('part-%05d.parquet' % (len(glob.glob(os.path.join(output_file, 'part-*.parquet')))))), engine = 'pyarrow')
+    else:
+        data.to_csv(output_file, sep = ',', mode = ('w' if offset == 0 else 'a'), header = (offset == 0))
+
+def parse_pcap_json(json_file, output_dir, batch_size = 10000, output_format = 'csv'):
+
+    # save as 'filtered/beamforming/csv/test<test-nr>.csv', in batches of batch_size bf reports
+    output_file = os.path.join(output_dir, ("%s.%s" % (os.path.splitext(os.path.basename(json_file))[0], output_format)))
+
+    start_time = timeit.default_timer()
+    data = []
+    n = 0
+    for pkt in read_json_packets(json_file):
+
+        record = get_bf_record(pkt)
+        if record is None:
+            continue
+
+        data.append(record)
+        if len(data) == batch_size:
+            write_batch(data, output_file, n, output_format)
+            n += len(data)
+            data = []
+
+    if data or (n == 0):
+        write_batch(data, output_file, n, output_format)
+        n += len(data)
+
+    sys.stderr.write("""[INFO] %s : %d bf reports in %.3f sec\n""" % (json_file, n, timeit.default_timer() - start_time))
+    return n
+
+def _parse_pcap_json(args):
+    return parse_pcap_json(*args)
+
+def parse_pcaps_json(input_dir, output_dir, processes = 1, batch_size = 10000, output_format = 'csv'):
+
+    bf_dir = os.path.join(input_dir, ('filtered/beamforming/json'))
+    tasks = [ (json_file, output_dir, batch_size, output_format) for json_file in sorted(glob.glob(os.path.join(bf_dir, ('*.json')))) ]
+
+    # each json file is parsed by a different process
+    if processes > 1:
+        pool = mp.Pool(processes = processes)
+        try:
+            pool.map(_parse_pcap_json, tasks)
+        except BaseException:
+            # a worker failed (e.g. on a malformed dump) : stop the pool w/o waiting for the other files
+            pool.terminate()
+            pool.join()
+            raise
+        pool.close()
+        pool.join()
+    else:
+        for task in tasks:
+            _parse_pcap_json(task)
 
 def extract_vht_compressed_bf_report(input_dir):
     
@@ -1306,6 +1437,12 @@ if __name__ == "__main__":
         "--graph-dir", 
          help = """dir to save graphs""")
 
+    parser.add_argument(
+        "--processes", 
+         help = """nr. of processes used to parse bf json files. default : 1""",
+         type = int,
+         default = 1)
+
     args = parser.parse_args()
     
     if not args.input_dir:
@@ -1336,7 +1473,7 @@ if __name__ == "__main__":
     if not os.path.exists(os.path.join(filtered_dir, ('beamforming/csv'))):
         csv_dir = os.path.join(filtered_dir, ('beamforming/csv'))
         os.makedirs(csv_dir)
-        parse_pcaps_json(args.input_dir, csv_dir)
+        parse_pcaps_json(args.input_dir, csv_dir, processes = args.processes)
 
     # scatter plots w/ nr. of xU-MIMO feedback messages
 #    plot_mimo_feedback_msg(args.input_dir, args.graph_dir)
@@ -453,9 +453,10 @@ def handle_list_traces(input_dir, trace_nr):
 
 def handle_list_laps(input_dir, trace_nr):
 
-    laps = analysis.trace.utils.data.extract_laps(args.input_dir, args.trace_nr)
+    trace_dir = os.path.join(input_dir, ("trace-%03d" % (int(trace_nr))))
+    laps = analysis.trace.utils.gps.get_laps(trace_dir)
 
-    if laps is None:
+    if laps.empty:
         return
 
     laps['speed'] = (laps['end xx'] - laps['start-xx']) / (laps['end-time'] - laps['start-time'])
@@ -536,6 +537,18 @@ if __name__ == "__main__":
          help = """lists trace dbs in .hdfs database""",
          action = 'store_true')
 
+    parser.add_argument(
+        "--to-parquet", 
+         help = """copy all trace dbs in .hdfs database to a parquet store w/ the same keys""",
+         action = 'store_true')
+
+    parser.add_argument(
+        "--db-format", 
+         help = """format of the .hdfs database : 'hdf5' (default), or 'parquet', i.e. the store 
+                w/ the same keys in database.parquet (e.g. filled w/ --to-parquet)""",
+         choices = utils.hdfs.DB_FORMATS,
+         default = 'hdf5')
+
     parser.add_argument(
         "--list-laps", 
          help = """lists available laps for trace""",
@@ -565,7 +578,14 @@ if __name__ == "__main__":
          help = """bitrate adaptation analysis (BETA)""",
          action = 'store_true')
 
+    parser.add_argument(
+        "--processes", 
+         help = """nr. of processes used for data extraction. default : 1""",
+         type = int,
+         default = 1)
+
     args = parser.parse_args()
+    utils.hdfs.set_format(args.db_format)
 
     if not args.input_dir:
         sys.stderr.write("""%s: [ERROR] must provide a dir w/ input files\n""" % sys.argv[0]) 
@@ -604,6 +624,11 @@ if __name__ == "__main__":
         handle_list_dbs(args.input_dir, args.trace_nr)
         sys.exit(0)
 
+    if args.to_parquet:
+        trace_dir = os.path.join(args.input_dir, ("trace-%03d" % (int(args.trace_nr))))
+        utils.hdfs.convert_db(trace_dir, hdfs_file = 'database.hdf5')
+        sys.exit(0)
+
     if args.list_laps:
         handle_list_laps(args.input_dir, args.trace_nr)
         sys.exit(0)
@@ -640,7 +665,7 @@ if __name__ == "__main__":
 
     trace = trace_list[trace_list['trace-nr'] == int(args.trace_nr)]
     trace_dir = os.path.join(args.input_dir, ("trace-%03d" % (int(args.trace_nr))))
-    trace_db_file = os.path.join(trace_dir, "processed/database.hdf5")
+    trace_db_file = utils.hdfs.get_db_path(trace_dir, 'database.hdf5')
     trace_output_dir = os.path.join(args.output_dir, ("trace-%03d" % (int(args.trace_nr))))
 
     if not os.path.isdir(trace_output_dir):
@@ -655,7 +680,7 @@ if __name__ == "__main__":
 
     # extract basic metrics into .hdfs, if not available
     if not [s for s in database if 'bitrate' in s]:
-        analysis.trace.utils.data.extract_bitrates(args.input_dir, args.trace_nr, protocol = trace['proto'].values[-1])
+        analysis.trace.utils.data.extract_bitrates(args.input_dir, args.trace_nr, protocol = trace['proto'].values[-1], processes = args.processes)
     if not [s for s in database if 'distances' in s]:
         analysis.trace.utils.data.extract_distances(args.input_dir, args.trace_nr, force_calc = True)
     if not [s for s in database if 'channel-util' in s]:
@@ -798,13 +823,17 @@ if __name__ == "__main__":
         },
         force_calc = False)
 
-    laps = analysis.trace.utils.data.extract_laps(args.input_dir, args.trace_nr)
+    laps = analysis.trace.utils.gps.get_laps(trace_dir)
+    # w/o laps.csv, compare over the whole trace
+    time_limits = [0.0, np.inf]
+    if not laps.empty:
+        time_limits = [laps[laps['lap'] == 2].iloc[0]['start-time'], laps[laps['lap'] == laps['lap'].max()].iloc[-1]['end-time']]
 
     plot.trace.ap_selection.metrics.compare(
         args.input_dir, args.trace_nr, trace_output_dir,
         configs = {
             'filename' : 'selection-comparison-thghpt',
-            'time-limits' : [laps[laps['lap'] == 2].iloc[0]['start-time'], laps[laps['lap'] == laps['lap'].max()].iloc[-1]['end-time']],
+            'time-limits' : time_limits,
             'methods' : {
                 '0:best' : {
                     'db' : '/best/throughput',
@@ -857,7 +886,7 @@ if __name__ == "__main__":
         args.input_dir, args.trace_nr, trace_output_dir,
         configs = {
             'filename' : 'handoff-analysis',
-            'time-limits' : [laps[laps['lap'] == 2].iloc[0]['start-time'], laps[laps['lap'] == laps['lap'].max()].iloc[-1]['end-time']],
+            'time-limits' : time_limits,
             'methods' : {
                 '0:best' : {
                     'db' : '/best/throughput',
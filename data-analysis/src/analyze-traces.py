@@ -160,8 +160,7 @@ def plot_bands(input_dir, output_dir, traces, metrics = ['wlan rssi', 'wlan data
             # fix 'nan' gaps in ['lat', 'lon'] by time interpolation
             analysis.trace.fix_gaps(data, subset = ['lat', 'lon'])
             # calculate distances
-            pos = [ [ row['lat'], row['lon'] ] for index, row in data[['lat', 'lon']].iterrows() ]
-            data['distance'] = [ mapping.utils.gps_to_dist(client['lat'], client['lon'], p[0], p[1]) for p in pos ]
+            data['distance'] = mapping.utils.gps_to_dist_matrix(data['lat'].values, data['lon'].values, client['lat'], client['lon'])[:, 0]
 
             band = ''
             if trace['channel'].values[-1] in [36, 40]:
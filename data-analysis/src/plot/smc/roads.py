@@ -34,6 +34,8 @@ import plot.smc.roads
 import plot.utils
 # - hdfs utils
 import utils.hdfs
+# - mapping utils
+import utils.mapping.utils
 
 # road ref points for xx calculation
 ref_points = {
@@ -53,11 +55,11 @@ def timespan(road_id, input_dir, output_dir, db_name = 'smf'):
     # (1) load data
     # - get subset of selected aps
     coverage_db = ('/roads/%s/coverage' % (road_id))
-    coverage_data = database.select(coverage_db)
+    coverage_data = database.select(coverage_db, columns = ['ap_id'])
     ap_ids = coverage_data['ap_id'].drop_duplicates()
     # - get ap data for ap subset
     data_db = ('/roads/%s/data' % (road_id))
-    data = database.select(data_db)
+    data = database.select(data_db, columns = ['timestamp', 'ap_id', 'lat', 'lon'])
     data = data[data['ap_id'].isin(ap_ids)].reset_index(drop = True)
     # - add column w/ 'day' timestamp
     data['day'] = data['timestamp'].apply(lambda x : (int(x / (3600 * 24)) * (3600 * 24)))
@@ -66,8 +68,7 @@ def timespan(road_id, input_dir, output_dir, db_name = 'smf'):
     # print(len(data['day'].drop_duplicates()))
     # print(len(data['session_id'].drop_duplicates()))
     # - add road xx position, in increments of 50 m
-    pos = [ [ row['lat'], row['lon'] ] for index, row in data[['lat', 'lon']].iterrows() ]
-    data['xx'] = [ mapping.utils.gps_to_dist(ref_points[road_id][0], ref_points[road_id][1], p[0], p[1]) for p in pos ]
+    data['xx'] = utils.mapping.utils.gps_to_dist_matrix(data['lat'].values, data['lon'].values, ref_points[road_id][0], ref_points[road_id][1])[:, 0]
     data['xx'] = data['xx'].apply(lambda x : int(round(x)))
     data['xx'] = ((data['xx'] / 50).astype(int) * 50).astype(int)
 
@@ -225,7 +226,7 @@ def signal_quality(input_dir, output_dir,
             sys.stderr.write("""[ERROR] %s not in database. skipping.\n""" % (db_name))
             continue
 
-        data = database.select(db_name)
+        data = database.select(db_name, columns = ['rss'])
         data.loc[data['rss'] > -30, 'rss'] = -30
         plot_configs['color'] = roads[road]['color']
         plot_configs['label'] = roads[road]['label']
@@ -280,7 +281,7 @@ def map(input_dir, output_dir,
     for road in roads:
 
         db = ('/roads/%s/data' % (road))
-        data = database.select(db)
+        data = database.select(db, columns = ['lat', 'lon'])
 
         maps_dir = os.path.join(output_dir, ("roads/maps/%s" % (road)))
         if not os.path.isdir(maps_dir):
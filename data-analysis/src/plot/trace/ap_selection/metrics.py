@@ -264,7 +264,7 @@ def handoff_analysis(input_dir, trace_nr, trace_output_dir,
             sys.stderr.write("""[ERROR] %s not in database. skipping.\n""" % (db_name))
             continue
 
-        data = database.select(db_name).sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
+        data = database.select(db_name, columns = ['timed-tmstmp', 'best']).sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
 
         if 'time-limits' in configs:
             data = data[(data['timed-tmstmp'] > configs['time-limits'][0]) & (data['timed-tmstmp'] < configs['time-limits'][1])]
@@ -375,7 +375,7 @@ def compare(
             sys.stderr.write("""[ERROR] %s not in database. skipping.\n""" % (db_name))
             continue
 
-        data = database.select(db_name).sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
+        data = database.select(db_name, columns = ['timed-tmstmp', 'best-val']).sort_values(by = ['timed-tmstmp']).reset_index(drop = True)
         data.rename(index = str, columns = {'best-val' : 'throughput'}, inplace = True)
 
         if 'time-limits' in configs:
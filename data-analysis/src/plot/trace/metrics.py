@@ -282,8 +282,7 @@ def vs_distance(ax, input_dir, trace_nr, configs):
 
     # add distance to ref point
     ref = {'lat' : 41.178685, 'lon' : -8.597872}
-    pos = [ [ row['lat'], row['lon'] ] for index, row in data[['lat', 'lon']].iterrows() ]
-    data['ref-dist'] = [ utils.mapping.utils.gps_to_dist(ref['lat'], ref['lon'], p[0], p[1]) for p in pos ]
+    data['ref-dist'] = utils.mapping.utils.gps_to_dist_matrix(data['lat'].values, data['lon'].values, ref['lat'], ref['lon'])[:, 0]
     data = data.sort_values(by = ['ref-dist']).reset_index(drop = True)
     # offset = data['ref-dist'].min()
     offset = 0.0
@@ -0,0 +1,224 @@
+# run-benchmarks.py : checks & benchmarks of vectorized code against the per-row code it replaced
+# Copyright (C) 2018  adamiaonr@cmu.edu
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import sys
+import pandas as pd
+import numpy as np
+import timeit
+import binascii
+
+from collections import defaultdict
+
+# custom imports
+#   - ieee 802.11ac utils
+import utils.ieee80211.ac as ac
+#   - ap selection
+import analysis.trace.ap_selection.rss
+#   - time buckets
+import analysis.trace.utils.buckets
+import analysis.trace.utils.metrics
+
+def decode_vht_mu_exclusive_bf_report_loop(data):
+
+    # per-row version of ac.decode_vht_mu_exclusive_bf_report(), as in the original decoder
+    data = data.dropna(subset = ['wlan mimo vht exclusive bf report'])
+
+    bf_data = []
+    for i, row in data.iterrows():
+
+        # compressed bf report
+        bf_report = row['wlan mimo vht exclusive bf report']
+        # mimo params
+        nc = int(row['wlan mimo nc']) + 1
+        channel_width = int(row['wlan mimo channel width'])
+        grouping = int(row['wlan mimo grouping'])
+
+        sub_carriers = ac.sscidx_mapping[channel_width][grouping]
+
+        offset = 0
+        mask = 0xFF
+        shift = 0
+
+        # for each subcarrier k
+        for k, sc in enumerate(sub_carriers):
+
+            bf_record = defaultdict()
+            bf_record['no'] = row['no']
+            bf_record['subcarrier'] = sc
+
+            # for each spatial stream i
+            for i in range(1, nc + 1):
+
+                if not k % 2:
+                    mask = 0x00F0
+                    shift = 4
+                else:
+                    mask = 0x000F
+                    shift = 0
+
+                # decode next 4 bit
+                delta_snr = int("0x%s" % (bf_report[offset:(offset + (1*2))]), 0) & mask
+                delta_snr = delta_snr >> shift
+                delta_snr = (delta_snr - 16) if delta_snr > 7 else delta_snr
+
+                bf_record[('delta-snr-%d' % (i))] = float(delta_snr)
+
+                if k % 2:
+                    offset += 1
+
+            bf_data.append(bf_record)
+
+    return pd.DataFrame(bf_data)
+
+def bench_ac(n = 1000, nc = 2, channel_width = 2, grouping = 0, seed = 0):
+
+    # compare ac.decode_vht_mu_exclusive_bf_report() against the per-row version, over n random reports
+    rng = np.random.RandomState(seed)
+    nsc = len(ac.sscidx_mapping[channel_width][grouping])
+    data = pd.DataFrame({
+        'no' : np.arange(1, n + 1),
+        'wlan mimo vht exclusive bf report' : [ binascii.hexlify(r.tobytes()).decode('ascii') for r in rng.randint(0, 256, (n, ((nsc * nc) + 1) // 2)).astype(np.uint8) ],
+        'wlan mimo nc' : (nc - 1),
+        'wlan mimo channel width' : channel_width,
+        'wlan mimo grouping' : grouping})
+
+    start_time = timeit.default_timer()
+    ref = decode_vht_mu_exclusive_bf_report_loop(data)
+    ref_time = timeit.default_timer() - start_time
+
+    start_time = timeit.default_timer()
+    res = ac.decode_vht_mu_exclusive_bf_report(data)
+    res_time = timeit.default_timer() - start_time
+
+    equal = ref.equals(res)
+    sys.stderr.write("""%s: [INFO] per-row decoder : %.3f sec, batch decoder : %.3f sec (%.1fx), equal : %s\n"""
+        % (sys.argv[0], ref_time, res_time, (ref_time / res_time), equal))
+
+    return equal
+
+def hysteresis_loop(rss, hysteresis = 5.0, floor = -80.0):
+
+    # per-sample version of analysis.trace.ap_selection.rss.hysteresis_kernel(), as in the original smoothed_hyteresis() loop
+    rss = np.asarray(rss, dtype = float)
+    _rss = np.where(np.isnan(rss), -np.inf, rss)
+    valid = ~np.all(np.isnan(rss), axis = 1)
+    best = np.where(valid, np.argmax(_rss, axis = 1), -1)
+    best_obs = np.where(valid, np.max(_rss, axis = 1), -90.0)
+
+    j = 0
+    prev_b = -1
+    for i in range(len(rss)):
+        prev_b = best[i]
+        if prev_b >= 0:
+            break
+        j += 1
+
+    for i in range(j + 1, len(rss)):
+        b = best[i]
+        if b < 0:
+            continue
+
+        curr_rss = rss[i, b]
+        prev_rss = rss[i, prev_b]
+        if (prev_rss > (curr_rss - hysteresis)) and (prev_rss > floor):
+            best[i] = prev_b
+            best_obs[i] = prev_rss
+        elif (curr_rss > floor):
+            prev_b = b
+            best_obs[i] = curr_rss
+        else:
+            best[i] = -1
+
+    return best, best_obs
+
+def check_hysteresis(n = 100, m = 4, runs = 1000, hysteresis = [0.0, 2.0, 5.0], seed = 0):
+
+    # compare analysis.trace.ap_selection.rss.hysteresis_kernel() against hysteresis_loop() over 
+    # random rss traces w/ n samples of m aps (incl. all-nan samples and ties)
+    rng = np.random.RandomState(seed)
+    diffs = 0
+    for r in range(runs):
+        rss = np.round(rng.uniform(-95.0, -55.0, size = (n, m)))
+        rss[rng.random_sample(n) < 0.05] = np.nan
+        for h in hysteresis:
+            ref, ref_obs = hysteresis_loop(rss, hysteresis = h)
+            res, res_obs = analysis.trace.ap_selection.rss.hysteresis_kernel(rss, hysteresis = h)
+            if not (np.array_equal(ref, res) and np.allclose(ref_obs, res_obs, equal_nan = True)):
+                diffs += 1
+
+    sys.stderr.write("""%s: [INFO] hysteresis_kernel() vs. loop : %d of %d traces differ\n""" % (sys.argv[0], diffs, runs * len(hysteresis)))
+    return (diffs == 0)
+
+def bench_buckets(n = 10 ** 6, width = 0.5, seed = 0):
+
+    # compare analysis.trace.utils.buckets.bucketize() against analysis.trace.utils.metrics.custom_round(),
+    # applied w/ Series.apply(), over n epoch timestamps w/ usec resolution
+    rng = np.random.RandomState(seed)
+    x = pd.Series(np.round(1548779000.0 + (rng.random_sample(n) * 3600.0), 6))
+    # include exact .25 sec ties
+    x.iloc[:(n // 100)] = np.round(x.iloc[:(n // 100)] * 4.0) / 4.0
+
+    start_time = timeit.default_timer()
+    ref = x.apply(analysis.trace.utils.metrics.custom_round, base = width, prec = analysis.trace.utils.buckets.get_prec(width))
+    ref_time = timeit.default_timer() - start_time
+
+    start_time = timeit.default_timer()
+    res = analysis.trace.utils.buckets.bucketize(x.values, width = width)
+    res_time = timeit.default_timer() - start_time
+
+    equal = np.array_equal(ref.values, res)
+    sys.stderr.write("""%s: [INFO] custom_round() : %.3f sec, bucketize() : %.3f sec (%.1fx), equal : %s\n"""
+        % (sys.argv[0], ref_time, res_time, (ref_time / res_time), equal))
+
+    return equal
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--ac",
+         help = """batch vs. per-row decoder of vht mu exclusive bf reports""",
+         action = 'store_true')
+
+    parser.add_argument(
+        "--hysteresis",
+         help = """vectorized vs. per-sample hysteresis ap selection""",
+         action = 'store_true')
+
+    parser.add_argument(
+        "--buckets",
+         help = """bucketize() vs. custom_round() for time buckets""",
+         action = 'store_true')
+
+    parser.add_argument(
+        "--n",
+         help = """nr. of samples (e.g. reports) per benchmark. default : 1000""",
+         type = int,
+         default = 1000)
+
+    args = parser.parse_args()
+
+    ok = True
+    if args.ac:
+        ok &= bench_ac(n = args.n)
+    if args.hysteresis:
+        ok &= check_hysteresis()
+    if args.buckets:
+        ok &= bench_buckets(n = args.n)
+
+    sys.exit(0 if ok else 1)
@@ -17,39 +17,285 @@
 import pandas as pd
 import os
 import sys
+import glob
+import shutil
+import atexit
 
-def get_db(input_dir, hdfs_file = 'database.hdf5'):
-    db_dir = os.path.join(input_dir, ("processed"))
-    if not os.path.isdir(db_dir):
+from contextlib import contextmanager
+from collections import defaultdict
+
+# pool of open .hdf5 stores, shared by all callers in the process, indexed by abs path
+# of the .hdf5 file. this way, a full trace run opens each .hdf5 file only once.
+_pool = {}
+# nr. of active db() contexts per .hdf5 file
+_refcnt = defaultdict(int)
+# modes which allow writing to a .hdf5 file
+_write_modes = ['a', 'r+', 'w']
+# in-memory catalogue of keys per .hdf5 file, indexed by abs path of the .hdf5 file
+_catalogue = {}
+# max. length of keys in the '/keys' table
+KEY_ITEMSIZE = 256
+# file extension which selects the parquet backend in get_db()
+PARQUET_EXT = '.parquet'
+# store format of the .hdf5 files named by callers (e.g. 'database.hdf5'), e.g. set by the analyze-* scripts w/ set_format() :
+#   - 'hdf5' : pd.HDFStore at <name>.hdf5 (default)
+#   - 'parquet' : ParquetStore at <name>.parquet, e.g. filled w/ convert_db()
+DB_FORMATS = ['hdf5', 'parquet']
+_format = {'name' : 'hdf5'}
+
+class ParquetStore(object):
+    # columnar alternative to pd.HDFStore, w/ the same key hierarchy : 
+    # each key is a dir under <input_dir>/processed/<name>.parquet, and each append()
+    # adds a new part-<nr>.parquet file to it. e.g.:
+    #   /m1/basic/beacons -> <name>.parquet/m1/basic/beacons/part-00000.parquet
+    # supports the subset of the pd.HDFStore interface used in this repo, plus
+    # column projection and predicate pushdown (pyarrow filters) in select()
+
+    def __init__(self, path, mode = 'a'):
+
+        # FIXME : pyarrow is only required for the parquet backend
+        import pyarrow.parquet
+        self._pq = pyarrow.parquet
+
+        self.filename = path
+        self._mode = mode
+        if (mode == 'w') and os.path.isdir(path):
+            shutil.rmtree(path)
+        if (mode != 'r') and (not os.path.isdir(path)):
+            os.makedirs(path)
+        self.is_open = True
+
+    def _get_dir(self, key):
+        return os.path.join(self.filename, *[k for k in key.split('/') if k])
+
+    def _get_parts(self, key):
+        return sorted(glob.glob(os.path.join(self._get_dir(key), 'part-*.parquet')))
+
+    def keys(self):
+        keys = []
+        for root, dirs, files in os.walk(self.filename):
+            if [f for f in files if f.startswith('part-') and f.endswith('.parquet')]:
+                keys.append('/' + '/'.join(os.path.relpath(root, self.filename).split(os.sep)))
+        return sorted(keys)
+
+    def __contains__(self, key):
+        return len(self._get_parts(key)) > 0
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def append(self, key, value, **kwargs):
+        # pd.HDFStore args such as data_columns, format or min_itemsize don't apply here
+        if self._mode not in _write_modes:
+            raise ValueError("""store %s opened in read-only mode""" % (self.filename))
+
+        key_dir = self._get_dir(key)
+        if not os.path.isdir(key_dir):
+            os.makedirs(key_dir)
+        value.to_parquet(os.path.join(key_dir, ('part-%05d.parquet' % (len(self._get_parts(key))))), engine = 'pyarrow')
+
+    def put(self, key, value, **kwargs):
+        if key in self:
+            self.remove(key)
+        self.append(key, value)
+
+    def select(self, key, columns = None, filters = None, **kwargs):
+        # e.g. select('/m1/basic/beacons', columns = ['epoch time', 'wlan rssi'], filters = [('wlan rssi', '>', -80.0)])
+        parts = self._get_parts(key)
+        if not parts:
+            raise KeyError("""no object named %s in the file""" % (key))
+        if kwargs.get('where', None) is not None:
+            raise ValueError("""where clauses aren't supported by the parquet backend. use filters instead""")
+
+        # FIXME : all parts of a key must have the same schema
+        dataset = self._pq.ParquetDataset(parts, filters = filters)
+        return dataset.read_pandas(columns = columns).to_pandas()
+
+    def get(self, key):
+        return self.select(key)
+
+    def get_nrows(self, key):
+        # from the parquet footers, w/o reading the data
+        return sum([ self._pq.ParquetFile(part).metadata.num_rows for part in self._get_parts(key) ])
+
+    def __getitem__(self, key):
+        return self.select(key)
+
+    def remove(self, key):
+        # as w/ pd.HDFStore, removing a key also removes the keys under it
+        if os.path.isdir(self._get_dir(key)):
+            shutil.rmtree(self._get_dir(key))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+def set_format(name):
+    if name not in DB_FORMATS:
+        raise ValueError("""unknown store format : %s (must be one of %s)""" % (name, ', '.join(DB_FORMATS)))
+    _format['name'] = name
+
+def get_db_file(hdfs_file = 'database.hdf5', db_format = None):
+    # name of the store file w/ format db_format (by default, the one set w/ set_format()), 
+    # e.g. 'database.hdf5' -> 'database.parquet'. explicit .parquet names are kept as is.
+    if db_format is None:
+        db_format = _format['name']
+    if (db_format == 'parquet') and hdfs_file.endswith('.hdf5'):
+        return os.path.splitext(hdfs_file)[0] + PARQUET_EXT
+    return hdfs_file
+
+def get_db_path(input_dir, hdfs_file = 'database.hdf5', db_format = None):
+    return os.path.abspath(os.path.join(os.path.join(input_dir, ("processed")), get_db_file(hdfs_file, db_format)))
+
+def get_db(input_dir, hdfs_file = 'database.hdf5', mode = 'a', db_format = None):
+
+    db_path = get_db_path(input_dir, hdfs_file, db_format)
+    db_dir = os.path.dirname(db_path)
+    if (mode != 'r') and (not os.path.isdir(db_dir)):
         os.makedirs(db_dir)
-        
-    database = pd.HDFStore(os.path.join(db_dir, hdfs_file))
+
+    database = _pool.get(db_path, None)
+    if (database is not None) and database.is_open:
+        if (mode == 'r') or (database._mode in _write_modes):
+            return database
+        # a write request on a read-only store : the store is only re-opened for writing if 
+        # no db() context holds it, otherwise we'd close the store under the feet of its holders
+        if _refcnt[db_path] > 0:
+            raise IOError("""%s opened in read-only mode by %d active db() context(s)""" % (db_path, _refcnt[db_path]))
+        database.close()
+
+    # FIXME : mode 'w' truncates the file, but only the 1st time it is opened in the process
+    if db_path.endswith(PARQUET_EXT):
+        database = ParquetStore(db_path, mode = mode)
+    else:
+        database = pd.HDFStore(db_path, mode = mode)
+    if not _pool:
+        # registered after pytables is loaded, so that close_dbs() runs before pytables' own exit handler
+        atexit.register(close_dbs)
+    _pool[db_path] = database
     return database
 
-def get_db_keys(input_dir, hdfs_file = 'database.hdf5'):
-    database = get_db(input_dir, hdfs_file = hdfs_file)
-    if '/keys' not in database:
-        update_db_keys(database)
-        
-    return database.select('/keys')['keys'].tolist()
+@contextmanager
+def db(input_dir, hdfs_file = 'database.hdf5', mode = 'a', db_format = None):
+    # reference-counted access to a pooled store, e.g.:
+    #   with utils.hdfs.db(trace_dir, 'database.hdf5') as database:
+    #       ...
+    # the store is flushed when the last active context exits, but kept open for later re-use.
+    # read-only stores (mode = 'r') should only be held within db() contexts, since get_db() 
+    # re-opens them for writing once no context holds them.
+    database = get_db(input_dir, hdfs_file, mode = mode, db_format = db_format)
+    db_path = get_db_path(input_dir, hdfs_file, db_format)
+    _refcnt[db_path] += 1
+
+    try:
+        yield database
+    finally:
+        _refcnt[db_path] -= 1
+        if (_refcnt[db_path] < 1) and database.is_open and (database._mode in _write_modes):
+            database.flush()
+
+def close_db(input_dir, hdfs_file = 'database.hdf5', db_format = None):
+
+    db_path = get_db_path(input_dir, hdfs_file, db_format)
+    database = _pool.pop(db_path, None)
+    _refcnt.pop(db_path, None)
+    _catalogue.pop(db_path, None)
+    if (database is not None) and database.is_open:
+        database.close()
+
+def close_dbs():
+    # flush & close all pooled stores (called on exit)
+    for db_path in list(_pool.keys()):
+        database = _pool.pop(db_path)
+        if database.is_open:
+            database.close()
+    _refcnt.clear()
+    _catalogue.clear()
+
+def _get_catalogue(database):
+    # in-memory set of keys of a .hdf5 file, lazily loaded from the special '/keys' table
+    db_path = os.path.abspath(database.filename)
+    if db_path not in _catalogue:
+        if isinstance(database, ParquetStore):
+            # parquet stores list their keys cheaply, no need for a '/keys' table
+            _catalogue[db_path] = set(database.keys())
+        elif '/keys' not in database:
+            if database._mode in _write_modes:
+                update_db_keys(database)
+            else:
+                # read-only stores can't be given a '/keys' table, so list their keys instead
+                _catalogue[db_path] = set([k for k in database.keys() if k != '/keys'])
+        else:
+            _catalogue[db_path] = set(database.select('/keys')['keys'].tolist())
+
+    return _catalogue[db_path]
+
+def get_db_keys(input_dir, hdfs_file = 'database.hdf5', db_format = None):
+
+    # re-use the pooled store in whatever mode it is open (e.g. w/in a read-only db() context), 
+    # otherwise open it read-only : listing keys never requires write access
+    db_path = get_db_path(input_dir, hdfs_file, db_format)
+    database = _pool.get(db_path, None)
+    if (database is None) or (not database.is_open):
+        if not os.path.exists(db_path):
+            return []
+        database = get_db(input_dir, hdfs_file = hdfs_file, mode = 'r', db_format = db_format)
+    return list(_get_catalogue(database))
 
 def update_db_keys(database, db_keys = None):
 
     if db_keys is None:
-        db_keys = database.keys()
+        db_keys = [k for k in database.keys() if k != '/keys']
+
+    if isinstance(database, ParquetStore):
+        _catalogue[os.path.abspath(database.filename)] = set(db_keys)
+        return
 
     # FIXME: we keep a special key w/ the keys of the hdfs db, for quick access
     df_keys = pd.DataFrame(columns = ['keys'])
     df_keys['keys'] = db_keys
 
-    if '/keys' in db_keys:
+    if '/keys' in database:
         database.remove('/keys')
     database.append(
         '/keys',
         df_keys,
         data_columns = df_keys.columns,
+        min_itemsize = {'keys' : KEY_ITEMSIZE},
         format = 'table')
 
+    _catalogue[os.path.abspath(database.filename)] = set(db_keys)
+
+def add_db_key(database, db):
+
+    catalogue = _get_catalogue(database)
+    if db in catalogue:
+        return
+
+    if isinstance(database, ParquetStore):
+        catalogue.add(db)
+        return
+
+    # the catalogue of a store 1st opened read-only has no '/keys' table to append to
+    if '/keys' not in database:
+        update_db_keys(database, list(catalogue) + [db])
+        return
+
+    # append-only update of '/keys' : a new key costs a single row append
+    try:
+        database.append(
+            '/keys',
+            pd.DataFrame({'keys' : [db]}),
+            data_columns = ['keys'],
+            min_itemsize = {'keys' : KEY_ITEMSIZE},
+            format = 'table')
+        catalogue.add(db)
+    except ValueError:
+        # '/keys' tables written by older versions may have a too narrow 'keys' column : re-write it
+        update_db_keys(database, list(catalogue) + [db])
+
 def to_hdfs(data, metric, database):
 
     database.append(
@@ -58,20 +304,73 @@ def to_hdfs(data, metric, database):
         data_columns = data.columns,
         format = 'table')
 
-    # update database keys whenever table is added
-    update_db_keys(database)
+    # database keys only change when a new table is added, i.e. 
+    # appending chunks to an existing table doesn't touch '/keys'
+    add_db_key(database, ('%s' % (metric)))
+
+def get_nrows(database, db):
+    # nr. of rows of a table, w/o reading it
+    if isinstance(database, ParquetStore):
+        return database.get_nrows(db)
+    return getattr(database.get_storer(db), 'nrows', None)
+
+def remove_db(database, db):
+
+    database.remove(db)
+
+    catalogue = _get_catalogue(database)
+    if db in catalogue:
+        catalogue.discard(db)
+        update_db_keys(database, list(catalogue))
 
 def remove_dbs(input_dir, hdfs_file = 'database.hdf5', dbs = []):
 
     database = get_db(input_dir, hdfs_file = hdfs_file)
     database_keys = get_db_keys(input_dir, hdfs_file = hdfs_file)
 
+    to_remove = []
     for db in dbs:
         if db in database_keys:
             database.remove(db)
+            to_remove.append(db)
             sys.stderr.write("""%s: [INFO] removed db %s\n""" % (sys.argv[0], db))
         else:
             sys.stderr.write("""%s: [INFO] db %s not in database\n""" % (sys.argv[0], db))
 
-    # update database keys whenever table is removed
-    update_db_keys(database)
\ No newline at end of file
+    # update database keys once, after all tables are removed
+    if to_remove:
+        update_db_keys(database, [k for k in database_keys if k not in to_remove])
+
+def convert_db(input_dir, hdfs_file = 'database.hdf5', parquet_file = None, chunksize = 10 ** 6, force = False):
+
+    # copy all tables of a .hdf5 file (e.g. database.hdf5 or smc.hdf5) to a parquet store
+    # w/ the same keys, by default <name>.parquet in the same dir. the source is always 
+    # the .hdf5 file, whatever the format set w/ set_format().
+    if parquet_file is None:
+        parquet_file = get_db_file(hdfs_file, db_format = 'parquet')
+
+    dst = get_db(input_dir, hdfs_file = parquet_file, mode = 'a')
+    with db(input_dir, hdfs_file = hdfs_file, mode = 'r', db_format = 'hdf5') as src:
+
+        for key in src.keys():
+
+            if key == '/keys':
+                continue
+
+            if key in dst:
+                if force:
+                    remove_db(dst, key)
+                else:
+                    sys.stderr.write("""%s: [INFO] db %s already in %s. skipping.\n""" % (sys.argv[0], key, parquet_file))
+                    continue
+
+            # tables are copied in chunks, fixed format objects in one go
+            if src.get_storer(key).is_table:
+                for chunk in src.select(key, chunksize = chunksize):
+                    to_hdfs(chunk, key, dst)
+            else:
+                to_hdfs(src.select(key), key, dst)
+
+            sys.stderr.write("""%s: [INFO] converted db %s\n""" % (sys.argv[0], key))
+
+    return dst
@@ -2,3 +2,4 @@ from __future__ import absolute_import
 
 import utils.ieee80211.ac
 import utils.ieee80211.beacon
+import utils.ieee80211.pcap
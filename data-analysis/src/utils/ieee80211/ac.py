@@ -16,6 +16,7 @@
 
 import pandas as pd
 import numpy as np
+import binascii
 
 from collections import defaultdict
 
@@ -87,182 +88,211 @@ def dequantize_angle(k, bits, psi = True):
         return ((float(k) * np.pi) / (2**(bits + 1))) + (np.pi / (2**(bits + 2)))
     else:
         return ((float(k) * np.pi) / (2**(bits - 1))) + (np.pi / (2**(bits)))
-        
+
+def dequantize_angles(k, bits, psi):
+    # array version of dequantize_angle(), w/ a nr. of bits per angle
+    k = k.astype(float)
+    return np.where(psi,
+        ((k * np.pi) / (2.0**(bits + 1))) + (np.pi / (2.0**(bits + 2))),
+        ((k * np.pi) / (2.0**(bits - 1))) + (np.pi / (2.0**(bits))))
+
+def get_angle_bits(feedback_type, codebook_info):
+    # nr. of bits of (psi, phi) angles
+    if (feedback_type):
+        return (7, 9) if codebook_info else (5, 7)
+    else:
+        return (4, 6) if codebook_info else (2, 4)
+
+def hex_to_bytes(reports):
+
+    # convert a list of hex strings to a (nr. reports x max. nr. bytes) uint8 array, right-padded w/ 0s,
+    # and the nr. of bytes of each report
+    reports = [ binascii.unhexlify(r) for r in reports ]
+    lengths = np.array([ len(r) for r in reports ], dtype = np.int64)
+    width = (lengths.max() if len(lengths) else 0)
+    if (lengths == width).all():
+        return np.frombuffer(b''.join(reports), dtype = np.uint8).reshape(len(reports), width), lengths
+
+    res = np.zeros((len(reports), width), dtype = np.uint8)
+    for i, r in enumerate(reports):
+        res[i, :len(r)] = np.frombuffer(r, dtype = np.uint8)
+    return res, lengths
+
+def get_angle_layout(nc, nr, psi, phi):
+
+    # position of the phi and psi angles of a subcarrier in a compressed bf report, relative to the start
+    # of the subcarrier. returns a list of (<column name>, <byte offset>, <right shift of 2 byte word>, <nr. bits>, <is psi>)
+    # and the nr. of bytes taken by a subcarrier.
+    # FIXME : this follows the bit order of the original per-subcarrier loop (e.g., bit position is reset at each
+    # subcarrier and advances for every (ir, ic) pair), not 8.4.1.48 in the ieee 802.11ac spec
+    layout = []
+    offset = 0
+    off_pos = 0
+    for angle, bits, rows, is_valid in [('phi', phi, range(1, nr), (lambda ir, ic : ir >= ic)), ('psi', psi, range(2, nr + 1), (lambda ir, ic : ir > ic))]:
+        for ic in range(1, nc + 1):
+            for ir in rows:
+
+                if is_valid(ir, ic):
+                    layout.append((('%s-%d-%d' % (angle, ir, ic)), offset, ((2 * 8) - off_pos - bits), bits, (angle == 'psi')))
+
+                off_pos += bits
+                if off_pos >= 8:
+                    offset += 1
+                    off_pos = off_pos % 8
+
+    return layout, offset
+
+def _decode_vht_compressed_bf_report(data, nc, nr, feedback_type, codebook_info, channel_width, grouping):
+
+    # decode a batch of compressed bf reports w/ the same mimo params
+    bf_report, lengths = hex_to_bytes(data['wlan mimo vht compressed bf report'].tolist())
+    nos = data['no'].values
+
+    # phi and psi angles, for all reports and subcarriers at once : 
+    #   - idx : (nr. subcarriers x nr. angles) array w/ the 1st byte of the 2 byte word which contains each angle
+    #   - words : (nr. reports x nr. subcarriers x nr. angles) array of 2 byte words
+    psi, phi = get_angle_bits(feedback_type, codebook_info)
+    layout, sc_len = get_angle_layout(nc, nr, psi, phi)
+    sub_carriers = sscidx_mapping[channel_width][grouping]
+    nsc = len(sub_carriers)
+
+    columns = [ l[0] for l in layout ]
+    shift = np.array([ l[2] for l in layout ], dtype = np.int64)
+    bits = np.array([ l[3] for l in layout ], dtype = np.int64)
+    is_psi = np.array([ l[4] for l in layout ], dtype = bool)
+    idx = nc + (np.arange(nsc, dtype = np.int64)[:, np.newaxis] * sc_len) + np.array([ l[1] for l in layout ], dtype = np.int64)[np.newaxis, :]
+
+    # pad w/ 0s, so that words can be read past the end of short reports
+    width = max(nc, (idx.max() + 2) if idx.size else 0)
+    bf_report = np.pad(bf_report, ((0, 0), (0, max(0, width - bf_report.shape[1]))), mode = 'constant').astype(np.int64)
+
+    # snr per stream (nc * 1 byte)
+    bf_ss_data = pd.DataFrame({'no' : nos})
+    for i in range(nc):
+        bf_ss_data[('avg-snr-%d' % (i + 1))] = np.where(lengths > i, (bf_report[:, i] / 4.0) + 22.0, np.nan)
+
+    words = (bf_report[:, idx] << 8) | bf_report[:, idx + 1]
+    # if the report ends w/in a word, only its 1st byte is available
+    lengths = lengths[:, np.newaxis, np.newaxis]
+    words = np.where((idx + 1) < lengths, words, bf_report[:, idx])
+    angles = dequantize_angles((words >> shift) & ((1 << bits) - 1), bits, is_psi)
+    # angles past the end of a report are invalid
+    angles = np.where(idx < lengths, angles, np.nan)
+
+    bf_sc_data = pd.DataFrame(angles.reshape((len(nos) * nsc), len(columns)), columns = columns)
+    bf_sc_data.insert(0, 'no', np.repeat(nos, nsc))
+    bf_sc_data.insert(1, 'subcarrier', np.tile(np.array(sub_carriers, dtype = np.int64), len(nos)))
+
+    return bf_sc_data, bf_ss_data
+
 def decode_vht_compressed_bf_report(data):
 
-    # subcarrier data
-    bf_sc_df = pd.DataFrame()
-    # spatial stream data
-    bf_ss_data = []
+    # decodes reports in batches of frames w/ the same mimo params, i.e. same nr. of angles and subcarriers. 
+    # returns :
+    #   - subcarrier data : one row per <frame, subcarrier>, w/ 'phi-<ir>-<ic>' and 'psi-<ir>-<ic>' angles
+    #   - spatial stream data : one row per frame, w/ 'avg-snr-<i>' per spatial stream
+    params = ['wlan mimo nc', 'wlan mimo nr', 'wlan mimo feedbacktype', 'wlan mimo codebookinfo', 'wlan mimo channel width', 'wlan mimo grouping']
+    data = data.dropna(subset = ['wlan mimo vht compressed bf report'] + params)
+    data = data[['no', 'wlan mimo vht compressed bf report'] + params].reset_index(drop = True)
+    if data.empty:
+        return pd.DataFrame(), pd.DataFrame()
 
-    for i, row in data.iterrows():
-        
-        # compressed bf report
-        bf_report = row['wlan mimo vht compressed bf report']
-        # mimo params
-        nc = row['wlan mimo nc'] + 1
-        nr = row['wlan mimo nr'] + 1
-        feedback_type = row['wlan mimo feedbacktype']
-        codebook_info = row['wlan mimo codebookinfo']
-        channel_width = row['wlan mimo channel width']
-        grouping = row['wlan mimo grouping']
-#        ns = ns_arr[channel_width][grouping]
-        
-        offset = 0
-        
-        # snr per stream (nc * 1 byte)
-        bf_ss_record = defaultdict()
-        bf_ss_record['no'] = row['no']
-        for i in range(nc):
-            avg_snr = (((int("0x%s" % (bf_report[offset:(offset + (1*2))]), 0) & 0xFF) / 4.0) + 22.0)
-            bf_ss_record[('avg-snr-%d' % (i + 1))] = avg_snr
-            offset += 1*2
-
-        bf_ss_data.append(bf_ss_record)
-    
-        if (feedback_type):
-            if (codebook_info):
-                psi = 7
-                phi = 9
-            else:
-                psi = 5
-                phi = 7
-    
-        else:
-            if (codebook_info):
-                psi = 4
-                phi = 6
-            else:
-                psi = 2
-                phi = 4
-        
-        # phi angle decode
-        # FIXME : this needs to be done for all subcarriers or subcarrier groups
-        # according to the info in 8.4.1.48 in the ieee 802.11ac spec
-        sub_carriers = sscidx_mapping[channel_width][grouping]
-        bf_sc_data = []
-        
-        for sc in sub_carriers:
-
-            bf_sc_record = defaultdict()
-            bf_sc_record['no'] = row['no']
-            bf_sc_record['subcarrier'] = sc
-            
-            off_pos = 0
-            for ic in range(1, nc + 1):
-                for ir in range(1, nr):
-        
-                    if (ir >= ic):
-                        
-                        # phi is between 4 and 9 bit, as such will always be contained within 2 byte (16 bit) after offset
-                        wd = int("0x%s" % (bf_report[offset:(offset + (2*2))]), 0)
-                        angle_val = wd >> ((2 * 8) - off_pos - phi)
-                        angle_val = angle_val & ~(~0 << phi)
-    
-    #                    bf_sc_record[('phi-%d-%d-%d' % (ir, ic, sc))] = dequantize_angle(angle_val, phi, psi = False)
-                        bf_sc_record[('phi-%d-%d' % (ir, ic))] = dequantize_angle(angle_val, phi, psi = False)                    
-                    
-                    off_pos += phi
-                    if off_pos >= 8:
-                        offset += 1*2
-                        off_pos = off_pos % 8
-        
-            # psi angle decode
-            for ic in range(1, nc + 1):
-                for ir in range(2, nr + 1):
+    data['pos'] = np.arange(len(data))
+    bf_sc_data = []
+    bf_ss_data = []
+    for p, batch in data.groupby(params, sort = False):
         
-                    if (ir > ic):
-                        
-                        # psi is between 2 and 7 bit, as such will always be contained within 2 byte (16 bit) after offset
-                        wd = int("0x%s" % (bf_report[offset:(offset + (2*2))]), 0)
-                        angle_val = wd >> ((2 * 8) - off_pos - psi)
-                        angle_val = angle_val & ~(~0 << psi)
-    
-    #                    bf_sc_record[('psi-%d-%d-%d' % (ir, ic, sc))] = dequantize_angle(angle_val, psi)
-                        bf_sc_record[('psi-%d-%d' % (ir, ic))] = dequantize_angle(angle_val, psi)                    
-                    
-                    off_pos += psi
-                    if off_pos >= 8:
-                        offset += 1*2
-                        off_pos = off_pos % 8
-                        
-            bf_sc_data.append(bf_sc_record)
-            
-        bf_sc_df = pd.concat([bf_sc_df, pd.DataFrame(bf_sc_data)], ignore_index = True)
-            
-    return bf_sc_df, pd.DataFrame(bf_ss_data)
+        nc, nr, feedback_type, codebook_info, channel_width, grouping = [ int(v) for v in p ]
+        bf_sc, bf_ss = _decode_vht_compressed_bf_report(batch, (nc + 1), (nr + 1), feedback_type, codebook_info, channel_width, grouping)
+        bf_sc['pos'] = np.repeat(batch['pos'].values, len(bf_sc) // len(batch))
+        bf_ss['pos'] = batch['pos'].values
+        bf_sc_data.append(bf_sc)
+        bf_ss_data.append(bf_ss)
+
+    # back to the original frame order
+    bf_sc_data = pd.concat(bf_sc_data, ignore_index = True).sort_values(by = ['pos'], kind = 'mergesort')
+    bf_ss_data = pd.concat(bf_ss_data, ignore_index = True).sort_values(by = ['pos'], kind = 'mergesort')
+
+    return bf_sc_data.drop(columns = ['pos']).reset_index(drop = True), bf_ss_data.drop(columns = ['pos']).reset_index(drop = True)
+
+# ascii code > hex digit value, e.g. ord('a') > 10
+_HEX_DIGITS = np.zeros(256, dtype = np.uint8)
+for _c in '0123456789abcdefABCDEF':
+    _HEX_DIGITS[ord(_c)] = int(_c, 16)
+
+def hex_to_digits(reports):
+
+    # convert a list of hex strings to a (nr. reports x max. nr. hex digits) uint8 array of digit values, 
+    # right-padded w/ 0s, and the nr. of hex digits of each report
+    reports = [ r.encode('ascii') for r in reports ]
+    lengths = np.array([ len(r) for r in reports ], dtype = np.int64)
+    res = np.zeros((len(reports), (lengths.max() if len(lengths) else 0)), dtype = np.uint8)
+    for i, r in enumerate(reports):
+        res[i, :len(r)] = np.frombuffer(r, dtype = np.uint8)
+    return _HEX_DIGITS[res], lengths
+
+def get_delta_snr_layout(nsc, nc):
+
+    # position of the hex digit read for each <subcarrier k, spatial stream i>, as in the original decoder :
+    #   - the k-th subcarrier reads a 2 digit window at a digit offset, which only advances (by 1 digit) 
+    #     after each spatial stream of odd subcarriers
+    #   - even subcarriers take the 1st digit of the window, odd subcarriers the 2nd digit.
+    #     if the window has a single digit, even subcarriers read 0 and odd subcarriers that digit.
+    # returns (nsc x nc) arrays w/ the offset of the window and the position of the digit in it
+    # FIXME : this follows the original decoder, not the delta snr order in the ieee 802.11ac spec,
+    # e.g. all spatial streams of even subcarriers get the same value
+    k = np.arange(nsc)[:, np.newaxis]
+    i = np.arange(nc)[np.newaxis, :]
+    odd = (k % 2).astype(bool)
+    offset = ((k // 2) * nc) + np.where(odd, i, 0)
+    return np.broadcast_to(offset, (nsc, nc)), np.broadcast_to(odd, (nsc, nc)).astype(np.int64)
 
 def decode_vht_mu_exclusive_bf_report(data):
-    
-    data = data.dropna(subset = ['wlan mimo vht exclusive bf report'])
-    
-    bf_df = pd.DataFrame()
-    for i, row in data.iterrows():
-        
-        bf_report = row['wlan mimo vht exclusive bf report']
-#        print(bf_report)
-#        if not bf_report:
-#            continue
-        
-        # compressed bf report
-        bf_report = row['wlan mimo vht exclusive bf report']
-        # mimo params
-        nc = row['wlan mimo nc'] + 1
-#        nr = row['wlan mimo nr'] + 1
-#        codebook_info = row['wlan mimo codebookinfo']
-        channel_width = row['wlan mimo channel width']
-        grouping = row['wlan mimo grouping']
-#        ns = ns_arr[channel_width][grouping]
-#        # nr. of subcarriers for which delta snr is reported by beamformees in MU-MIMO
-#        xnsc = delta_ns_arr[channel_width][grouping]
-
-        offset = 0
-        
-#        # nr. of bytes to represent delta snr : 
-#        #   - nc: nr. of spatial streams
-#        #   - xnsc: nr. of subcarriers
-#        #   - 4: delta snr values represented in 4 bit
-#        if ((nc * xnsc * 4) % 8)
-#            off_len = (nc * xnsc * 4) / 8 + 1
-#        else
-#            off_len = (nc * xnsc * 4) / 8
-        
-#        print('chann. width : %d, ng : %d' % (channel_width, grouping))
+
+    # decodes reports in batches of frames w/ the same nr. of spatial streams and subcarriers.
+    # returns one row per <frame, subcarrier>, w/ 'delta-snr-<i>' per spatial stream.
+    # delta snr values are 4 bit 2's complement values, i.e. a hex digit of the report, 
+    # picked for each subcarrier k and spatial stream i as in get_delta_snr_layout().
+    # values the original decoder couldn't read (i.e., past the end of a report) are nan.
+    params = ['wlan mimo nc', 'wlan mimo channel width', 'wlan mimo grouping']
+    data = data.dropna(subset = ['wlan mimo vht exclusive bf report'] + params)
+    data = data[['no', 'wlan mimo vht exclusive bf report'] + params].reset_index(drop = True)
+    if data.empty:
+        return pd.DataFrame()
+
+    data['pos'] = np.arange(len(data))
+    bf_data = []
+    for p, batch in data.groupby(params, sort = False):
+
+        nc, channel_width, grouping = [ int(v) for v in p ]
+        nc += 1
         sub_carriers = sscidx_mapping[channel_width][grouping]
+        nsc = len(sub_carriers)
 
-        mask = 0xFF 
-        shift = 0
-
-        bf_data = []
-        # for each subcarrier k
-        for k, sc in enumerate(sub_carriers):
-
-            bf_record = defaultdict()
-            bf_record['no'] = row['no']
-            bf_record['subcarrier'] = sc
-
-            # for each spatial stream i
-            for i in range(1, nc + 1):
-                
-                if not k % 2:
-                    mask = 0x00F0
-                    shift = 4
-                else:
-                    mask = 0x000F
-                    shift = 0
-                
-                # decode next 4 bit
-                delta_snr = int("0x%s" % (bf_report[offset:(offset + (1*2))]), 0) & mask
-                delta_snr = delta_snr >> shift
-                delta_snr = (delta_snr - 16) if delta_snr > 7 else delta_snr
-                
-#                print('delta-snr-%d-%d : %d' % (k, i, delta_snr))
-                bf_record[('delta-snr-%d' % (i))] = float(delta_snr)
-                
-                if k % 2:
-                    offset += 1
-                
-            bf_data.append(bf_record)
-        bf_df = pd.concat([bf_df, pd.DataFrame(bf_data)], ignore_index = True)
-        
-    return bf_df
\ No newline at end of file
+        # (nr. reports x nr. hex digits) array, padded so that all windows are w/in bounds
+        digits, lengths = hex_to_digits(batch['wlan mimo vht exclusive bf report'].tolist())
+        offset, second = get_delta_snr_layout(nsc, nc)
+        digits = np.pad(digits, ((0, 0), (0, max(0, int(offset.max()) + 2 - digits.shape[1]))), mode = 'constant')
+
+        # nr. of digits of the window of each value (0 to 2), per report
+        offset = offset.ravel()[np.newaxis, :]
+        second = second.ravel()[np.newaxis, :].astype(bool)
+        window = np.clip(lengths[:, np.newaxis] - offset, 0, 2)
+        # digit of the window, or 0 for the 1st digit of single digit windows
+        idx = offset + (second & (window == 2))
+        values = np.take_along_axis(digits, idx, axis = 1)
+        values[(~second) & (window == 1)] = 0
+        # sign extension of 4 bit values
+        delta_snr = ((values.astype(np.int8) ^ 0x08) - 0x08).astype(float)
+        # windows past the end of a report
+        delta_snr[window == 0] = np.nan
+
+        bf = pd.DataFrame(delta_snr.reshape((len(batch) * nsc), nc), columns = [ ('delta-snr-%d' % (i)) for i in range(1, nc + 1) ])
+        bf.insert(0, 'no', np.repeat(batch['no'].values, nsc))
+        bf.insert(1, 'subcarrier', np.tile(np.array(sub_carriers, dtype = np.int64), len(batch)))
+        bf['pos'] = np.repeat(batch['pos'].values, nsc)
+        bf_data.append(bf)
+
+    # back to the original frame order
+    bf_data = pd.concat(bf_data, ignore_index = True).sort_values(by = ['pos'], kind = 'mergesort')
+    return bf_data.drop(columns = ['pos']).reset_index(drop = True)
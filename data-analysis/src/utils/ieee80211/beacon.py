@@ -19,6 +19,65 @@ import numpy as np
 
 from collections import defaultdict
 
+# bit fields of hex info elements, as {<feature> : {'shift' : <bit offset>, 'mask' : <bit mask>}}
+HT_CAPABILITIES = {
+    'ht-cap-ldpc'          : {'shift' : 0, 'mask' : 0x01},
+    'ht-cap-channel-width' : {'shift' : 1, 'mask' : 0x01},
+    'ht-cap-sm-power-save' : {'shift' : 2, 'mask' : 0x03},
+    'ht-cap-green-field'   : {'shift' : 4, 'mask' : 0x01},
+    'ht-cap-short-gi-20'   : {'shift' : 5, 'mask' : 0x01},
+    'ht-cap-short-gi-40'   : {'shift' : 6, 'mask' : 0x01},
+    'ht-cap-tx-stbc'       : {'shift' : 7, 'mask' : 0x01},
+    'ht-cap-rx-stbc'       : {'shift' : 8, 'mask' : 0x03},
+    'ht-cap-delayed-block-ack' : {'shift' : 10, 'mask' : 0x01},
+    'ht-cap-max-amsdu-len'     : {'shift' : 11, 'mask' : 0x01},
+    'ht-cap-dsss-cck-40'       : {'shift' : 12, 'mask' : 0x01},
+    'ht-cap-psmp'       : {'shift' : 13, 'mask' : 0x01},
+    'ht-cap-40-intolerance'    : {'shift' : 14, 'mask' : 0x01},
+    'ht-cap-l-sig-txop-protection' : {'shift' : 15, 'mask' : 0x01}
+}
+
+HT_AMPDU = {
+    'ht-ampdu-max-rx-ampdu-len' : {'shift' : 0, 'mask' : 0x03},
+    'ht-ampdu-mpdu-density' : {'shift' : 2, 'mask' : 0x07}
+}
+
+HT_INFO_SUBSET_1 = {
+    'ht-info-subset-secondary-channel-offset' : {'shift' : 0, 'mask' : 0x03},
+    'ht-info-subset-supp-channel-width' : {'shift' : 2, 'mask' : 0x01},
+    'ht-info-subset-rifs' : {'shift' : 3, 'mask' : 0x01},
+    'ht-info-subset-psmp' : {'shift' : 4, 'mask' : 0x01},
+    'ht-info-subset-shortest-serv-interval' : {'shift' : 5, 'mask' : 0x07}
+}
+
+VHT_CAPABILITIES = {
+    'vht-cap-max-mpdu-len' : {'shift' : 0, 'mask' : 0x03},
+    'vht-cap-160-channel-width' : {'shift' : 2, 'mask' : 0x03},
+    'vht-cap-rx-ldpc' : {'shift' : 4, 'mask' : 0x01},
+    'vht-cap-short-gi-80' : {'shift' : 5, 'mask' : 0x01},
+    'vht-cap-short-gi-160' : {'shift' : 6, 'mask' : 0x01},
+    'vht-cap-tx-stbc' : {'shift' : 7, 'mask' : 0x01},
+    'vht-cap-rx-stbc' : {'shift' : 8, 'mask' : 0x07},
+    'vht-cap-su-bmfr' : {'shift' : 11, 'mask' : 0x01},
+    'vht-cap-su-bmfe' : {'shift' : 12, 'mask' : 0x01},
+    'vht-cap-bmfe-sts' : {'shift' : 13, 'mask' : 0x07},
+    'vht-cap-sounding-dim' : {'shift' : 16, 'mask' : 0x07},
+    'vht-cap-mu-bmfr' : {'shift' : 19, 'mask' : 0x01},
+    'vht-cap-mu-bmfe' : {'shift' : 20, 'mask' : 0x01},
+    'vht-cap-txop-ps' : {'shift' : 21, 'mask' : 0x01},
+    'vht-cap-htc-vht' : {'shift' : 22, 'mask' : 0x01},
+    'vht-cap-max-ampdu-len-exp' : {'shift' : 23, 'mask' : 0x07},
+    'vht-cap-vht-link-adapt' : {'shift' : 26, 'mask' : 0x03},
+    'vht-cap-rx-antn-pat-cons' : {'shift' : 28, 'mask' : 0x01},
+    'vht-cap-tx-antn-pat-cons' : {'shift' : 29, 'mask' : 0x01},
+    'vht-cap-ext-nss-bw' : {'shift' : 30, 'mask' : 0x03}
+}
+
+# ascii code -> value of hex digit (0xff if not a hex digit)
+_HEX_LUT = np.full(256, 0xff, dtype = np.uint8)
+_HEX_LUT[np.frombuffer(b'0123456789abcdef', dtype = np.uint8)] = np.arange(16)
+_HEX_LUT[np.frombuffer(b'ABCDEF', dtype = np.uint8)] = np.arange(10, 16)
+
 def decode_ht_supported_channel_width(value):
     if 'Channel of any width supported' in value:
         return {'ht-info-channel-width' : 40}
@@ -56,36 +115,58 @@ def decode(value, decode_key):
         res[k] = ((value >> decode_key[k]['shift']) & decode_key[k]['mask'])
     return res
 
+def hex_to_int(values):
+
+    # parse a column of hex strings (e.g. '0x000019ef') at once, w/o calling int() per value.
+    # returns an array of np.uint64 values and a mask of valid values (i.e. not nan and valid hex)
+    values = pd.Series(values)
+    res = np.zeros(len(values), dtype = np.uint64)
+    valid = values.notna().values.copy()
+    if not valid.any():
+        return res, valid
+
+    # fixed-width ascii bytes (right-padded w/ '\0'), one row per value
+    chars = np.asarray(values[valid].astype(str), dtype = object).astype(np.bytes_)
+    width = chars.dtype.itemsize
+    chars = chars.view(np.uint8).reshape(-1, width)
+    if width > 18:
+        raise ValueError("""hex values w/ more than 64 bit not supported""")
+
+    # accumulate hex digits left to right, skipping the '0x' prefix, padding and spaces
+    digits = _HEX_LUT[chars]
+    is_digit = (digits != 0xff)
+    ok = (is_digit | np.isin(chars, np.frombuffer(b'xX \0', dtype = np.uint8))).all(axis = 1)
+    _res = np.zeros(len(chars), dtype = np.uint64)
+    for i in range(width):
+        _res = np.where(is_digit[:, i], (_res << np.uint64(4)) | digits[:, i].astype(np.uint64), _res)
+
+    res[valid] = np.where(ok, _res, 0)
+    valid[valid] = ok
+    return res, valid
+
+def decode_column(values, decode_key):
+
+    # column-at-a-time version of decode(), e.g. decode_column(beacons['wlan ht capabilities'], HT_CAPABILITIES).
+    # returns a dataframe w/ a uint8 column per bit field, or float32 w/ nan if some values are missing.
+    value, valid = hex_to_int(values)
+    res = pd.DataFrame(index = pd.Series(values).index)
+    for k in decode_key:
+        field = ((value >> np.uint64(decode_key[k]['shift'])) & np.uint64(decode_key[k]['mask'])).astype(np.uint8)
+        if valid.all():
+            res[k] = field
+        else:
+            res[k] = np.where(valid, field, np.nan).astype(np.float32)
+
+    return res
+
 def decode_ht_capabilities(value):
 
-    decode_key = {
-        'ht-cap-ldpc'          : {'shift' : 0, 'mask' : 0x01},
-        'ht-cap-channel-width' : {'shift' : 1, 'mask' : 0x01},
-        'ht-cap-sm-power-save' : {'shift' : 2, 'mask' : 0x03},
-        'ht-cap-green-field'   : {'shift' : 4, 'mask' : 0x01},
-        'ht-cap-short-gi-20'   : {'shift' : 5, 'mask' : 0x01},
-        'ht-cap-short-gi-40'   : {'shift' : 6, 'mask' : 0x01},
-        'ht-cap-tx-stbc'       : {'shift' : 7, 'mask' : 0x01},
-        'ht-cap-rx-stbc'       : {'shift' : 8, 'mask' : 0x03},
-        'ht-cap-delayed-block-ack' : {'shift' : 10, 'mask' : 0x01},
-        'ht-cap-max-amsdu-len'     : {'shift' : 11, 'mask' : 0x01},
-        'ht-cap-dsss-cck-40'       : {'shift' : 12, 'mask' : 0x01},
-        'ht-cap-psmp'       : {'shift' : 13, 'mask' : 0x01},
-        'ht-cap-40-intolerance'    : {'shift' : 14, 'mask' : 0x01},
-        'ht-cap-l-sig-txop-protection' : {'shift' : 15, 'mask' : 0x01}
-    }
-
-    ht_cap = decode(value, decode_key)
+    ht_cap = decode(value, HT_CAPABILITIES)
     return ht_cap
 
 def decode_ht_ampdu(value):
 
-    decode_key = {
-        'ht-ampdu-max-rx-ampdu-len' : {'shift' : 0, 'mask' : 0x03},
-        'ht-ampdu-mpdu-density' : {'shift' : 2, 'mask' : 0x07}
-    }
-
-    ht_ampdu = decode(value, decode_key)
+    ht_ampdu = decode(value, HT_AMPDU)
     return ht_ampdu
 
 def decode_txbf(value):
@@ -100,13 +181,7 @@ def decode_extended_capabilities(value):
 def decode_ht_info_subset(value, nr = 1):
 
     if nr == 1:
-        decode_key = {
-            'ht-info-subset-secondary-channel-offset' : {'shift' : 0, 'mask' : 0x03},
-            'ht-info-subset-supp-channel-width' : {'shift' : 2, 'mask' : 0x01},
-            'ht-info-subset-rifs' : {'shift' : 3, 'mask' : 0x01},
-            'ht-info-subset-psmp' : {'shift' : 4, 'mask' : 0x01},
-            'ht-info-subset-shortest-serv-interval' : {'shift' : 5, 'mask' : 0x07}}
-
+        decode_key = HT_INFO_SUBSET_1
     else:
         return {}
 
@@ -118,28 +193,5 @@ def decode_fixed_capabilities(value):
 
 def decode_vht_capabilities(value):
 
-    decode_key = {
-        'vht-cap-max-mpdu-len' : {'shift' : 0, 'mask' : 0x03},
-        'vht-cap-160-channel-width' : {'shift' : 2, 'mask' : 0x03},
-        'vht-cap-rx-ldpc' : {'shift' : 4, 'mask' : 0x01},
-        'vht-cap-short-gi-80' : {'shift' : 5, 'mask' : 0x01},
-        'vht-cap-short-gi-160' : {'shift' : 6, 'mask' : 0x01},
-        'vht-cap-tx-stbc' : {'shift' : 7, 'mask' : 0x01},
-        'vht-cap-rx-stbc' : {'shift' : 8, 'mask' : 0x07},
-        'vht-cap-su-bmfr' : {'shift' : 11, 'mask' : 0x01},
-        'vht-cap-su-bmfe' : {'shift' : 12, 'mask' : 0x01},
-        'vht-cap-bmfe-sts' : {'shift' : 13, 'mask' : 0x07},
-        'vht-cap-sounding-dim' : {'shift' : 16, 'mask' : 0x07},
-        'vht-cap-mu-bmfr' : {'shift' : 19, 'mask' : 0x01},
-        'vht-cap-mu-bmfe' : {'shift' : 20, 'mask' : 0x01},
-        'vht-cap-txop-ps' : {'shift' : 21, 'mask' : 0x01},
-        'vht-cap-htc-vht' : {'shift' : 22, 'mask' : 0x01},
-        'vht-cap-max-ampdu-len-exp' : {'shift' : 23, 'mask' : 0x07},
-        'vht-cap-vht-link-adapt' : {'shift' : 26, 'mask' : 0x03},
-        'vht-cap-rx-antn-pat-cons' : {'shift' : 28, 'mask' : 0x01},
-        'vht-cap-rx-antn-pat-cons' : {'shift' : 29, 'mask' : 0x01},
-        'vht-cap-ext-nss-bw' : {'shift' : 30, 'mask' : 0x03}
-    }
-
-    vht_info_cap = decode(value, decode_key)
+    vht_info_cap = decode(value, VHT_CAPABILITIES)
     return vht_info_cap
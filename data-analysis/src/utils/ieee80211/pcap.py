@@ -0,0 +1,326 @@
+# pcap.py : read ieee 802.11 frames w/ radiotap headers from .pcap files, w/o tshark
+# Copyright (C) 2018  adamiaonr@cmu.edu
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pandas as pd
+import numpy as np
+import os
+import struct
+
+# pcap magic nrs., as {<magic> : (<byte order>, <timestamp resolution>)}
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1' : ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4' : ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1' : ('<', 1e-9),
+    b'\xa1\xb2\x3c\x4d' : ('>', 1e-9)
+}
+
+# link types
+LINKTYPE_IEEE802_11 = 105
+LINKTYPE_IEEE802_11_RADIOTAP = 127
+
+# radiotap fields, as {<bit in 'present' word> : (<alignment>, <size>)}, from https://www.radiotap.org/fields/defined
+RADIOTAP_FIELDS = {
+    0 : (8, 8),     # tsft
+    1 : (1, 1),     # flags
+    2 : (1, 1),     # rate
+    3 : (2, 4),     # channel
+    4 : (1, 2),     # fhss
+    5 : (1, 1),     # dbm antenna signal
+    6 : (1, 1),     # dbm antenna noise
+    7 : (2, 2),     # lock quality
+    8 : (2, 2),     # tx attenuation
+    9 : (2, 2),     # db tx attenuation
+    10 : (1, 1),    # dbm tx power
+    11 : (1, 1),    # antenna
+    12 : (1, 1),    # db antenna signal
+    13 : (1, 1),    # db antenna noise
+    14 : (2, 2),    # rx flags
+    15 : (2, 2),    # tx flags
+    16 : (1, 1),    # rts retries
+    17 : (1, 1),    # data retries
+    18 : (4, 8),    # xchannel
+    19 : (1, 3),    # mcs
+    20 : (4, 8),    # a-mpdu status
+    21 : (2, 12),   # vht
+    22 : (8, 12),   # timestamp
+    23 : (2, 12),   # he
+    24 : (2, 12),   # he-mu
+    25 : (2, 6),    # he-mu-other-user
+    26 : (1, 1),    # 0-length-psdu
+    27 : (2, 4)     # l-sig
+}
+
+RADIOTAP_RATE = 2
+RADIOTAP_DBM_ANTSIGNAL = 5
+RADIOTAP_MCS = 19
+RADIOTAP_VHT = 21
+
+# data subcarriers per channel width (MHz) and data bits per subcarrier per mcs index,
+# used to calc ht and vht data rates, e.g. 20 MHz, mcs 7, 1 spatial stream, long gi : 52 * 5.0 / 4.0 us = 65 Mbps
+N_SD = {20 : 52, 40 : 108, 80 : 234, 160 : 468}
+N_BPSCS = np.array([0.5, 1.0, 1.5, 2.0, 3.0, 4.0, 4.5, 5.0, 6.0, (20.0 / 3.0)])
+
+# vht bandwidth field (radiotap) > channel width (MHz)
+VHT_BANDWIDTH = np.array(([20] + ([40] * 3) + ([80] * 7) + ([160] * 15) + ([0] * 230)), dtype = np.int64)
+
+# wlan type-subtype names, as shown by wireshark, indexed by (type << 4) | subtype
+TYPE_SUBTYPES = {
+    0x00 : 'Association Request',
+    0x01 : 'Association Response',
+    0x02 : 'Reassociation Request',
+    0x03 : 'Reassociation Response',
+    0x04 : 'Probe Request',
+    0x05 : 'Probe Response',
+    0x06 : 'Measurement Pilot',
+    0x08 : 'Beacon frame',
+    0x09 : 'ATIM',
+    0x0a : 'Disassociate',
+    0x0b : 'Authentication',
+    0x0c : 'Deauthentication',
+    0x0d : 'Action',
+    0x0e : 'Action No Ack',
+    0x14 : 'Beamforming Report Poll',
+    0x15 : 'VHT NDP Announcement',
+    0x17 : 'Control Wrapper',
+    0x18 : '802.11 Block Ack Req',
+    0x19 : '802.11 Block Ack',
+    0x1a : 'Power-Save poll',
+    0x1b : 'Request-to-send',
+    0x1c : 'Clear-to-send',
+    0x1d : 'Acknowledgement',
+    0x1e : 'CF-End',
+    0x1f : 'CF-End + CF-Ack',
+    0x20 : 'Data',
+    0x24 : 'Null function (No data)',
+    0x28 : 'QoS Data',
+    0x2c : 'QoS Null function (No data)'
+}
+_TYPE_SUBTYPE_NAMES = np.array([ TYPE_SUBTYPES.get(i, 'Unknown') for i in range(64) ], dtype = object)
+# retry flag > names, as in the 'wlan retry' column of tshark's .csv output
+_RETRY_NAMES = np.array(['Frame is not being retransmitted', 'Frame is being retransmitted'], dtype = object)
+
+# ip protocol nrs. > names
+IP_PROTOS = {1 : 'ICMP', 6 : 'TCP', 17 : 'UDP'}
+
+# columns of the dataframes returned by read_pcap(), named as in the monitor.*.csv files
+COLUMNS = ['no', 'epoch time', 'frame len', 'wlan rssi', 'wlan data rate', 'wlan src addr', 'wlan dst addr',
+    'wlan type-subtype', 'wlan retry', 'wlan seq number', 'wlan frag number', 'ip proto']
+
+_HEX_CHARS = np.frombuffer(b'0123456789abcdef', dtype = np.uint8)
+
+def _get_uint(buf, idx, size, byteorder = '<'):
+    # gather unsigned ints of size bytes, starting at byte positions idx of buf
+    idx = np.clip(idx, 0, len(buf) - size)
+    res = np.zeros(len(idx), dtype = np.uint64)
+    for k in range(size):
+        shift = (8 * k) if byteorder == '<' else (8 * (size - 1 - k))
+        res |= buf[idx + k].astype(np.uint64) << np.uint64(shift)
+    return res.astype(np.int64)
+
+def _get_addr(buf, idx, valid):
+    # mac addrs of 6 bytes starting at idx, as 'xx:xx:xx:xx:xx:xx' str (nan if not valid)
+    octets = buf[np.clip(idx, 0, len(buf) - 6)[:, np.newaxis] + np.arange(6)]
+    chars = np.full((len(idx), 17), ord(':'), dtype = np.uint8)
+    chars[:, 0::3] = _HEX_CHARS[octets >> 4]
+    chars[:, 1::3] = _HEX_CHARS[octets & 0x0f]
+    addrs = chars.view('S17').ravel().astype(str).astype(object)
+    addrs[~valid] = np.nan
+    return addrs
+
+def get_radiotap_offsets(present, nwords = 1):
+
+    # offsets of the fields in the 1st radiotap namespace, from the start of the radiotap header,
+    # given its 1st 'present' word and the total nr. of 'present' words. returns {<field bit> : <offset>}.
+    # FIXME : parsing stops at the 1st undefined field, since its size is unknown.
+    offsets = {}
+    offset = 4 + (4 * nwords)
+    for b in range(29):
+
+        if not (present & (1 << b)):
+            continue
+        if b not in RADIOTAP_FIELDS:
+            break
+
+        align, size = RADIOTAP_FIELDS[b]
+        offset = ((offset + align - 1) // align) * align
+        offsets[b] = offset
+        offset += size
+
+    return offsets
+
+def get_data_rate(buf, idx, offsets):
+
+    # wlan data rate in Mbps, from (by order of preference) the rate, mcs or vht radiotap fields
+    data_rate = np.full(len(idx), np.nan)
+
+    if RADIOTAP_VHT in offsets:
+        off = idx + offsets[RADIOTAP_VHT]
+        sgi = (_get_uint(buf, off + 2, 1) >> 2) & 0x01
+        n_sd = pd.Series(VHT_BANDWIDTH[_get_uint(buf, off + 3, 1)]).map(N_SD).values.astype(float)
+        mcs_nss = _get_uint(buf, off + 4, 1)
+        mcs = mcs_nss >> 4
+        nss = mcs_nss & 0x0f
+        valid = (mcs < len(N_BPSCS)) & (nss > 0)
+        rate = (n_sd * N_BPSCS[np.minimum(mcs, len(N_BPSCS) - 1)] * nss) / np.where(sgi, 3.6, 4.0)
+        data_rate = np.where(valid, np.round(rate, 1), data_rate)
+
+    if RADIOTAP_MCS in offsets:
+        off = idx + offsets[RADIOTAP_MCS]
+        flags = _get_uint(buf, off + 1, 1)
+        mcs = _get_uint(buf, off + 2, 1)
+        n_sd = np.where((flags & 0x03) == 1, N_SD[40], N_SD[20])
+        valid = (mcs < 32)
+        rate = (n_sd * N_BPSCS[mcs % 8] * ((mcs // 8) + 1)) / np.where((flags >> 2) & 0x01, 3.6, 4.0)
+        data_rate = np.where(valid, np.round(rate, 1), data_rate)
+
+    if RADIOTAP_RATE in offsets:
+        # in units of 500 kbps
+        rate = _get_uint(buf, idx + offsets[RADIOTAP_RATE], 1)
+        data_rate = np.where(rate > 0, rate / 2.0, data_rate)
+
+    return data_rate
+
+def decode_frames(buf, rec_pos, byteorder, ts_res, linktype, columns = COLUMNS):
+
+    # decode the records starting at byte positions rec_pos of buf, all at once. 
+    # columns not in columns are skipped (the radiotap, mac addr and type-subtype ones are the slowest).
+    n = len(rec_pos)
+    pos = rec_pos + 16
+    incl_len = _get_uint(buf, rec_pos + 8, 4, byteorder)
+    res = pd.DataFrame(index = np.arange(n))
+    res['epoch time'] = _get_uint(buf, rec_pos, 4, byteorder) + (_get_uint(buf, rec_pos + 4, 4, byteorder) * ts_res)
+    res['frame len'] = _get_uint(buf, rec_pos + 12, 4, byteorder)
+
+    # radiotap header : fields are grouped by the layout of 'present' words, so that
+    # the offsets of each field are calculated once per layout
+    rssi = np.full(n, np.nan)
+    data_rate = np.full(n, np.nan)
+    if linktype == LINKTYPE_IEEE802_11_RADIOTAP:
+        rt_len = _get_uint(buf, pos + 2, 2)
+    elif linktype == LINKTYPE_IEEE802_11:
+        rt_len = np.zeros(n, dtype = np.int64)
+    else:
+        raise ValueError("""unsupported pcap link type : %d""" % (linktype))
+
+    if (linktype == LINKTYPE_IEEE802_11_RADIOTAP) and (('wlan rssi' in columns) or ('wlan data rate' in columns)):
+
+        present = [_get_uint(buf, pos + 4, 4)]
+        ext = (present[0] >> 31) & 0x01
+        while ext.any() and (len(present) < 8):
+            present.append(np.where(ext, _get_uint(buf, pos + (4 * (len(present) + 1)), 4), 0))
+            ext = ext & ((present[-1] >> 31) & 0x01)
+
+        # the offsets of the fields in the 1st namespace only depend on the 1st word and the nr. of words
+        nwords = np.ones(n, dtype = np.int64)
+        for w in present[:-1]:
+            nwords += (w >> 31) & 0x01
+        layouts, layout_idx = np.unique(present[0] | (nwords << 32), return_inverse = True)
+        for i, layout in enumerate(layouts):
+
+            sel = np.where(layout_idx == i)[0]
+            offsets = get_radiotap_offsets((int(layout) & 0xffffffff), nwords = (int(layout) >> 32))
+            if RADIOTAP_DBM_ANTSIGNAL in offsets:
+                rssi[sel] = _get_uint(buf, pos[sel] + offsets[RADIOTAP_DBM_ANTSIGNAL], 1).astype(np.int8)
+            data_rate[sel] = get_data_rate(buf, pos[sel], offsets)
+
+    res['wlan rssi'] = rssi
+    res['wlan data rate'] = data_rate
+
+    # ieee 802.11 header
+    f = pos + rt_len
+    f_len = incl_len - rt_len
+    fc0 = _get_uint(buf, f, 1)
+    fc1 = _get_uint(buf, f + 1, 1)
+    ftype = (fc0 >> 2) & 0x03
+    subtype = (fc0 >> 4) & 0x0f
+
+    if 'wlan src addr' in columns:
+        res['wlan src addr'] = _get_addr(buf, f + 10, (f_len >= 16) & ~((ftype == 1) & np.isin(subtype, [7, 12, 13])))
+    if 'wlan dst addr' in columns:
+        res['wlan dst addr'] = _get_addr(buf, f + 4, (f_len >= 10))
+    if 'wlan type-subtype' in columns:
+        res['wlan type-subtype'] = np.where(f_len >= 2, _TYPE_SUBTYPE_NAMES[(ftype << 4) | subtype], np.nan)
+    res['wlan retry'] = np.where(f_len >= 2, _RETRY_NAMES[(fc1 >> 3) & 0x01], np.nan)
+
+    # sequence control (mgmt and data frames only)
+    has_seq = (ftype != 1) & (f_len >= 24)
+    seq_ctrl = _get_uint(buf, f + 22, 2)
+    res['wlan seq number'] = np.where(has_seq, seq_ctrl >> 4, np.nan)
+    res['wlan frag number'] = np.where(has_seq, seq_ctrl & 0x0f, np.nan)
+
+    # ip protocol of unprotected data frames, w/ llc/snap header and ipv4 payload :
+    #   - header length : 24 byte + 6 byte (addr4, if ToDS and FromDS) + 2 byte (qos ctrl) + 4 byte (ht ctrl, if order bit in qos frames)
+    qos = (ftype == 2) & ((subtype & 0x08) > 0)
+    addr4 = ((fc1 & 0x03) == 0x03)
+    hdr_len = 24 + (6 * addr4) + (2 * qos) + (4 * (qos & ((fc1 >> 7) & 0x01).astype(bool)))
+    amsdu = qos & ((_get_uint(buf, f + 24 + (6 * addr4), 1) & 0x80) > 0)
+    llc = f + hdr_len
+    ip = llc + 8
+    is_ip = ((ftype == 2) & ((subtype & 0x04) == 0) & (((fc1 >> 6) & 0x01) == 0) & ~amsdu
+        & (f_len >= (hdr_len + 8 + 20))
+        & (_get_uint(buf, llc, 3, '>') == 0xaaaa03)
+        & (_get_uint(buf, llc + 6, 2, '>') == 0x0800)
+        & ((_get_uint(buf, ip, 1) >> 4) == 4))
+    proto = _get_uint(buf, ip + 9, 1)
+    res['ip proto'] = np.where(is_ip, pd.Series(proto).map(IP_PROTOS).fillna(pd.Series(proto).astype(str)).values, np.nan)
+
+    return res
+
+def get_header(buf):
+
+    # pcap global header : <magic (4 byte), version (2 + 2 byte), thiszone (4 byte), sigfigs (4 byte), snaplen (4 byte), linktype (4 byte)>
+    magic = bytes(buf[:4])
+    if magic not in PCAP_MAGIC:
+        raise ValueError("""not a .pcap file (pcapng files are not supported)""")
+
+    byteorder, ts_res = PCAP_MAGIC[magic]
+    linktype = struct.unpack_from(byteorder + 'I', buf, 20)[0] & 0x0fffffff
+    return byteorder, ts_res, linktype
+
+def read_pcap(filename, columns = COLUMNS, batch_size = 10 ** 6):
+
+    # read a .pcap file in batches of batch_size frames. yields one dataframe w/ columns (a subset of COLUMNS) 
+    # per batch, e.g. pd.concat(read_pcap('monitor.36.80.1538493210.pcap'), ignore_index = True)
+    if not os.path.getsize(filename):
+        return
+
+    buf = np.memmap(filename, dtype = np.uint8, mode = 'r').view(np.ndarray)
+    byteorder, ts_res, linktype = get_header(buf)
+    incl_len = struct.Struct(byteorder + 'I')
+
+    pos = 24
+    no = 1
+    size = len(buf)
+    while pos + 16 <= size:
+
+        # the position of each record depends on the length of the previous one,
+        # so records are found one at a time, and decoded in batches
+        rec_pos = []
+        while (pos + 16 <= size) and (len(rec_pos) < batch_size):
+            rec_pos.append(pos)
+            pos += 16 + incl_len.unpack_from(buf, pos + 8)[0]
+
+        # drop a truncated last record
+        if pos > size:
+            rec_pos = rec_pos[:-1]
+        if not rec_pos:
+            break
+
+        res = decode_frames(buf, np.array(rec_pos, dtype = np.int64), byteorder, ts_res, linktype, columns = columns)
+        res['no'] = np.arange(no, no + len(res))
+        no += len(res)
+
+        yield res[list(columns)]
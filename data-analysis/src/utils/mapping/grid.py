@@ -0,0 +1,152 @@
+# grid.py : regular <lat, lon> grids of square cells (e.g., 20 x 20 m cells over a map)
+# Copyright (C) 2018  adamiaonr@cmu.edu
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import absolute_import
+
+import pandas as pd
+import numpy as np
+
+# custom imports
+#   - mapping utils
+import utils.mapping.utils
+
+# grids already created by get_grid(), indexed by <bbox, cell size>
+_grids = {}
+
+def get_cell_num(cell_size, lat, lon):
+    # x-axis : longitude
+    LAT = sum(np.array(lat)) / 2.0
+    X_CELL_NUM = int(np.ceil((utils.mapping.utils.gps_to_dist(LAT, lon[0], LAT, lon[1]) / cell_size)))
+    # y-axis : latitude
+    Y_CELL_NUM = int(np.ceil((utils.mapping.utils.gps_to_dist(lat[0], 0.0, lat[1], 0.0) / cell_size)))
+    return X_CELL_NUM, Y_CELL_NUM
+
+def get_closest_cells(cells, candidates):
+
+    # closest candidate cell to each cell, in nr. of cells (i.e., manhattan distance over <cell_x, cell_y>),
+    # w/ a kd-tree over the candidates, in O(n log m) instead of O(n x m).
+    # returns (closest, diff), w/ closest as a (n x 2) array of <cell_x, cell_y> and diff as the distances.
+    # FIXME : ties are broken by the kd-tree, not necessarily in favor of the first candidate
+    # FIXME : sklearn is only required for this lookup, so it isn't imported w/ the module
+    from sklearn.neighbors import KDTree
+
+    cells = np.asarray(cells, dtype = float).reshape(-1, 2)
+    candidates = np.asarray(candidates, dtype = float).reshape(-1, 2)
+    diff, idx = KDTree(candidates, metric = 'manhattan').query(cells, k = 1)
+    return candidates[idx[:, 0]], diff[:, 0]
+
+def get_grid(bbox, cell_size):
+    # a Grid is immutable, so re-use the one created for the same <bbox, cell size>
+    # (e.g., when adding cells to each chunk of a large .csv file)
+    key = (tuple([ float(b) for b in bbox ]), float(cell_size))
+    if key not in _grids:
+        _grids[key] = Grid(bbox, cell_size)
+    return _grids[key]
+
+class Grid(object):
+
+    # grid of xx x yy cells of ~cell_size x cell_size meters over bbox = [<lon w>, <lat s>, <lon e>, <lat n>].
+    # cells are identified by <cell_x, cell_y> (x-axis : longitude, y-axis : latitude) or by a single
+    # integer id, cell_id = (cell_y * xx) + cell_x.
+    def __init__(self, bbox, cell_size):
+
+        self.bbox = [ float(b) for b in bbox ]
+        self.lon_w, self.lat_s, self.lon_e, self.lat_n = self.bbox
+        self.cell_size = float(cell_size)
+        # extract nr. of cells in the designated area
+        self.xx, self.yy = get_cell_num(cell_size = self.cell_size, lat = [self.lat_n, self.lat_s], lon = [self.lon_w, self.lon_e])
+        # cell width & height, in degrees
+        self.w = (self.lon_e - self.lon_w) / float(self.xx)
+        self.h = (self.lat_n - self.lat_s) / float(self.yy)
+
+    def __len__(self):
+        return (self.xx * self.yy)
+
+    def __repr__(self):
+        return ('Grid(bbox = %s, cell_size = %s, xx = %d, yy = %d)' % (self.bbox, self.cell_size, self.xx, self.yy))
+
+    def get_cells(self, lat, lon):
+        # <cell_x, cell_y> of <lat, lon> points. as in int(), coords are truncated towards 0,
+        # so points slightly off the w or s edges of the grid end up in the 1st row / column.
+        cell_x = np.trunc((np.asarray(lon, dtype = float) - self.lon_w) / (self.lon_e - self.lon_w) * self.xx).astype(np.int64)
+        cell_y = np.trunc((np.asarray(lat, dtype = float) - self.lat_s) / (self.lat_n - self.lat_s) * self.yy).astype(np.int64)
+        return cell_x, cell_y
+
+    def in_bounds(self, cell_x, cell_y):
+        cell_x = np.asarray(cell_x)
+        cell_y = np.asarray(cell_y)
+        return (cell_x >= 0) & (cell_y >= 0) & (cell_x < self.xx) & (cell_y < self.yy)
+
+    def get_cell_ids(self, cell_x, cell_y):
+        return (np.asarray(cell_y, dtype = np.int64) * self.xx) + np.asarray(cell_x, dtype = np.int64)
+
+    def get_cell_coords(self, cell_ids):
+        # inverse of get_cell_ids(), i.e. <cell_x, cell_y> of cell ids
+        cell_ids = np.asarray(cell_ids, dtype = np.int64)
+        return (cell_ids % self.xx), (cell_ids // self.xx)
+
+    def get_centroids(self, cell_x, cell_y):
+        # <lat, lon> of the centers of cells
+        lat = self.lat_s + ((np.asarray(cell_y, dtype = float) + 0.5) * self.h)
+        lon = self.lon_w + ((np.asarray(cell_x, dtype = float) + 0.5) * self.w)
+        return lat, lon
+
+    def get_bounds(self, cell_x, cell_y):
+        # [<lon w>, <lat s>, <lon e>, <lat n>] edges of cells, as a (n x 4) array
+        cell_x = np.asarray(cell_x, dtype = float)
+        cell_y = np.asarray(cell_y, dtype = float)
+        return np.column_stack([
+            self.lon_w + (cell_x * self.w), self.lat_s + (cell_y * self.h),
+            self.lon_w + ((cell_x + 1) * self.w), self.lat_s + ((cell_y + 1) * self.h)])
+
+    def get_all_cells(self):
+        # all cells of the grid, w/ columns ['id', 'cell_x', 'cell_y'], ordered by cell_x, then cell_y
+        cell_x, cell_y = [ c.ravel() for c in np.meshgrid(np.arange(self.xx), np.arange(self.yy), indexing = 'ij') ]
+        return pd.DataFrame({'id' : self.get_cell_ids(cell_x, cell_y), 'cell_x' : cell_x, 'cell_y' : cell_y})
+
+    def get_neighbours(self, cell_x, cell_y, radius = 1):
+
+        # cells w/in radius cells (in x and y) of each cell, excluding the cell itself and cells off the grid,
+        # e.g. radius = 1 gives the 8 adjacent cells. returns a dataframe w/ one row per <cell, neighbour>,
+        # w/ the position of the cell in the input in 'idx' and the neighbour in ['cell_x', 'cell_y', 'cell_id'].
+        cell_x = np.asarray(cell_x, dtype = np.int64).ravel()
+        cell_y = np.asarray(cell_y, dtype = np.int64).ravel()
+        dx, dy = [ d.ravel() for d in np.meshgrid(np.arange(-radius, radius + 1), np.arange(-radius, radius + 1), indexing = 'ij') ]
+        offsets = ((dx != 0) | (dy != 0))
+        dx, dy = dx[offsets], dy[offsets]
+
+        idx = np.repeat(np.arange(len(cell_x)), len(dx))
+        nb_x = (cell_x[:, None] + dx[None, :]).ravel()
+        nb_y = (cell_y[:, None] + dy[None, :]).ravel()
+        valid = self.in_bounds(nb_x, nb_y)
+        idx, nb_x, nb_y = idx[valid], nb_x[valid], nb_y[valid]
+
+        return pd.DataFrame({'idx' : idx, 'cell_x' : nb_x, 'cell_y' : nb_y, 'cell_id' : self.get_cell_ids(nb_x, nb_y)})
+
+    def get_nearest_cells(self, lat, lon, candidates):
+        # closest candidate cell (e.g., cells w/ data) to each <lat, lon> point. see get_closest_cells().
+        cell_x, cell_y = self.get_cells(lat, lon)
+        return get_closest_cells(np.column_stack([cell_x, cell_y]), candidates)
+
+    def add_cells(self, data, lat = 'lat', lon = 'lon'):
+
+        # add ['cell_x', 'cell_y', 'cell_id'] columns to data, based on [lat, lon]
+        data['cell_x'], data['cell_y'] = self.get_cells(data[lat].values, data[lon].values)
+        # drop rows with out-of-bounds cell coords
+        data.drop(data.index[~self.in_bounds(data['cell_x'].values, data['cell_y'].values)], inplace = True)
+        # it will be useful to get a single integer id
+        data['cell_id'] = self.get_cell_ids(data['cell_x'].values, data['cell_y'].values)
+
+        return data
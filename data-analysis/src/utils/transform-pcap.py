@@ -16,10 +16,125 @@
 
 import os
 import sys
+import csv
 import json
 import argparse
 import glob
+import time
 import timeit
+import subprocess
+
+from multiprocessing.pool import ThreadPool
+
+# pcap > csv modes in the tshark config
+MODES = ['mgmt', 'data', 'sweep']
+# columns of the manifest file, w/ one row per tshark job
+MANIFEST_COLUMNS = ['pcap file', 'mode', 'csv file', 'status', 'start', 'duration', 'pcap size', 'csv size', 'throughput']
+
+def get_jobs(input_dir, output_dir, tshark_config):
+
+    # list of <pcap file, mode> conversions, w/ the final location of the .csv file 
+    # (e.g. <output-dir>/<folder>/trace-<nr>/monitor.<wifi-type>.<...>.<mode>.csv) and tshark arguments
+    jobs = []
+    csv_files = set()
+    for wifi_type in tshark_config:
+
+        base_dir = os.path.join(input_dir, tshark_config[wifi_type]['folder'])
+        for pcap_file in sorted(glob.glob(os.path.join(base_dir, ('trace-*/monitor.%s.*.pcap' % (wifi_type))))):
+            for mode in tshark_config[wifi_type]:
+
+                if mode not in MODES:
+                    continue
+
+                output_file = '.'.join(pcap_file.split('.')[:-2]) + ('.%s.csv' % (mode))
+                csv_file = os.path.join(os.path.join(output_dir, tshark_config[wifi_type]['folder']), '/'.join(output_file.split('/')[-2:]))
+
+                # FIXME : .pcap files of the same trace w/ the same prefix map to the same .csv file.
+                # only the 1st one is converted, as when the .csv files were made one at a time.
+                if csv_file in csv_files:
+                    continue
+                csv_files.add(csv_file)
+
+                # fields (-e) & filter (-Y) arguments of the tshark command, built from the configs dict
+                cmd = ['tshark', '-r', pcap_file, '-2', '-T', 'fields']
+                for field in tshark_config[wifi_type][mode]['fields']:
+                    cmd += ['-e', field]
+                cmd += ['-Y', tshark_config[wifi_type][mode]['filter'], '-E', 'header=y', '-E', 'separator=,', '-E', 'quote=d', '-E', 'occurrence=f']
+
+                jobs.append({'pcap file' : pcap_file, 'mode' : mode, 'csv file' : csv_file, 'cmd' : cmd})
+
+    return jobs
+
+def run_job(job):
+
+    # run tshark w/ stdout written directly to the final location. output goes to a '.part' file, 
+    # renamed once tshark finishes, so that interrupted jobs are re-run.
+    csv_file = job['csv file']
+    part_file = csv_file + '.part'
+    if not os.path.isdir(os.path.dirname(csv_file)):
+        try:
+            os.makedirs(os.path.dirname(csv_file))
+        except OSError:
+            # created by another worker
+            pass
+
+    start_time = time.time()
+    start = timeit.default_timer()
+    with open(part_file, 'w') as f:
+        try:
+            status = subprocess.call(job['cmd'], stdout = f)
+        except OSError as error:
+            sys.stderr.write("""%s: [ERROR] could not run tshark : %s\n""" % (sys.argv[0], error))
+            status = -1
+    duration = timeit.default_timer() - start
+
+    if status == 0:
+        os.rename(part_file, csv_file)
+        csv_size = os.path.getsize(csv_file)
+    else:
+        sys.stderr.write("""%s: [ERROR] tshark exited w/ status %d for %s (%s)\n""" % (sys.argv[0], status, job['pcap file'], job['mode']))
+        csv_size = 0
+
+    pcap_size = os.path.getsize(job['pcap file'])
+    return {
+        'pcap file' : job['pcap file'],
+        'mode' : job['mode'],
+        'csv file' : csv_file,
+        'status' : status,
+        'start' : start_time,
+        'duration' : duration,
+        'pcap size' : pcap_size,
+        'csv size' : csv_size,
+        # MB of .pcap per sec
+        'throughput' : ((pcap_size / 1e6) / duration) if duration > 0.0 else 0.0}
+
+def run_jobs(jobs, manifest_file, processes = 1):
+
+    # skip jobs w/ .csv files already in place (e.g., from a previous run)
+    todo = []
+    for job in jobs:
+        if os.path.isfile(job['csv file']):
+            print('%s: %s already exists. skipping processing.' % (sys.argv[0], job['csv file']))
+        else:
+            todo.append(job)
+
+    # tshark does the heavy lifting, so jobs are handled by threads, each waiting for a tshark process
+    write_header = (not os.path.isfile(manifest_file))
+    with open(manifest_file, 'a') as f:
+
+        manifest = csv.DictWriter(f, fieldnames = MANIFEST_COLUMNS)
+        if write_header:
+            manifest.writeheader()
+
+        pool = ThreadPool(processes = processes)
+        for res in pool.imap_unordered(run_job, todo):
+            if res['status'] == 0:
+                print('%s : processed %s > %s (%.3f sec, %.3f MB/s)' % (sys.argv[0], res['pcap file'], res['csv file'], res['duration'], res['throughput']))
+            manifest.writerow(res)
+            f.flush()
+
+        pool.close()
+        pool.join()
 
 if __name__ == "__main__":
 
@@ -37,6 +152,12 @@ if __name__ == "__main__":
         "--tshark-config", 
          help = """.json file w/ tshark config""")
 
+    parser.add_argument(
+        "--processes", 
+         help = """nr. of concurrent tshark processes. default : 1""",
+         type = int,
+         default = 1)
+
     args = parser.parse_args()
 
     if not args.input_dir:
@@ -57,42 +178,10 @@ if __name__ == "__main__":
     with open(args.tshark_config) as tconfig:
         tshark_config = json.load(tconfig)
 
-    for wifi_type in tshark_config:
-
-        base_dir = os.path.join(args.input_dir, tshark_config[wifi_type]['folder'])
-        for pcap_file in sorted(glob.glob(os.path.join(base_dir, ('trace-*/monitor.%s.*.pcap' % (wifi_type))))):
-            for mode in tshark_config[wifi_type]:
-
-                if mode not in ['mgmt', 'data', 'sweep']:
-                    continue
-
-                output_file = '.'.join(pcap_file.split('.')[:-2]) + ('.%s.csv' % (mode))
-                move_loc = os.path.join(os.path.join(args.output_dir, tshark_config[wifi_type]['folder']), '/'.join(output_file.split('/')[-2:]))
-
-                if os.path.isfile(move_loc):
-                    print('%s: %s already exists. skipping processing.' % (sys.argv[0], move_loc))
-                    continue
-
-                print('processing %s' % (pcap_file))
-
-                # fields (-e) & filter (-Y) arguments of the tshark command, as str, built from the configs dict
-                fields = "-e " + " -e ".join(tshark_config[wifi_type][mode]['fields'])
-                filtr = tshark_config[wifi_type][mode]['filter']
-
-                cmd = 'tshark -r %s -2 -T fields %s -Y "%s" -E header=y -E separator=, -E quote=d -E occurrence=f > %s' % (pcap_file, fields, filtr, output_file)
-                # print(cmd)
-                start = timeit.default_timer()
-                os.system(cmd)
-
-                if os.path.isfile(output_file):
-                    print('%s : processed %s (%.3f sec)' % (sys.argv[0], pcap_file, timeit.default_timer() - start))
-
-                # move file to final location (external data bank)
-                print('moving %s > %s' % (output_file, move_loc))
-                start = timeit.default_timer()
-                os.system('mv %s %s' % (output_file, move_loc))
-
-                if os.path.isfile(move_loc):
-                    print('%s : moved %s > %s (%.3f sec)' % (sys.argv[0], output_file, move_loc, timeit.default_timer() - start))
+    # per-job timing and throughput, appended to <output-dir>/transform-pcap.manifest.csv
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    manifest_file = os.path.join(args.output_dir, 'transform-pcap.manifest.csv')
+    run_jobs(get_jobs(args.input_dir, args.output_dir, tshark_config), manifest_file, processes = args.processes)
 
     sys.exit(0)